@@ -1,16 +1,45 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 from __future__ import annotations
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
+from itertools import repeat
+import gzip
+import os
 import time
+import warnings
 from typing import List, Optional, Dict, Iterable, Tuple
+import numpy as np
 import pandas as pd
 from PyQt5 import QtCore, QtWidgets
-from pandas.util import hash_pandas_object
+from pandas.util import hash_array
 
-from file_block import FileBlock
+from file_block import FileBlock, _column_display
 from sum_dialog import SumDialog
 
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pacsv
+except ImportError:  # optional – ไม่มีก็ใช้ทาง numpy/object ปกติ
+    pa = pc = pacsv = None
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:  # optional – ไม่มีก็ export .parquet ไม่ได้ (.arrow ยังได้ถ้ามี pyarrow)
+    pq = None
+
+try:
+    import xlsxwriter
+except ImportError:  # optional – ไม่มีก็ export ผ่าน pd.ExcelWriter (openpyxl)
+    xlsxwriter = None
+
+try:
+    import numexpr
+except ImportError:  # optional – ใช้เฉพาะเมื่อไม่มี numba (tolerance mask แบบ fused)
+    numexpr = None
+
 try:
     from theme import set_table_defaults
 except Exception:
@@ -31,15 +60,67 @@ except Exception:
 # Small helpers
 # =============================
 class PandasModel(QtCore.QAbstractTableModel):
+    # แปลงเป็นข้อความทีละ tile (คอลัมน์ × 1024 แถว) เฉพาะส่วนที่ view ขอ แล้วเก็บแบบ LRU
+    # → หน่วยความจำคงที่ไม่ว่าตารางจะใหญ่แค่ไหน และ data() ไม่ต้อง iat/isna/str ทุก cell
+    TILE_ROWS = 1024
+    MAX_TILES = 64
+
     def __init__(self, df: Optional[pd.DataFrame] = None, parent=None):
         super().__init__(parent)
         self._df = df if df is not None else pd.DataFrame()
+        self._tiles: "OrderedDict[Tuple[int, int], np.ndarray]" = OrderedDict()
+        self._colnames: List[str] = [str(c) for c in self._df.columns]
 
     def set_df(self, df: Optional[pd.DataFrame]):
         self.beginResetModel()
         self._df = df if df is not None else pd.DataFrame()
+        self._tiles.clear()
+        self._colnames = [str(c) for c in self._df.columns]
         self.endResetModel()
 
+    def update_df(self, df: Optional[pd.DataFrame], *, structural: bool = True) -> bool:
+        """เปลี่ยนข้อมูลโดยไม่ reset ทั้ง view (scroll/selection ยังอยู่) ถ้าคอลัมน์เหมือนเดิม
+
+        structural=True หรือคอลัมน์เปลี่ยน → ตกไปใช้ set_df (begin/endResetModel) ตามเดิม; คืน True ถ้า reset
+        """
+        new = df if df is not None else pd.DataFrame()
+        if structural or not new.columns.equals(self._df.columns):
+            self.set_df(new)
+            return True
+        old_n, new_n = len(self._df), len(new)
+        # tile เป็นของ df เก่า → ทิ้งก่อน begin*Rows และสลับ df + ทิ้ง tile อีกรอบก่อน end*Rows
+        # (listener ของ rowsInserted/rowsRemoved เรียก data() ได้ทันที ห้ามเจอ tile ค้างที่สั้นกว่า)
+        self._tiles.clear()
+        if new_n < old_n:
+            self.beginRemoveRows(QtCore.QModelIndex(), new_n, old_n - 1)
+            self._df = new
+            self._tiles.clear()
+            self.endRemoveRows()
+        elif new_n > old_n:
+            self.beginInsertRows(QtCore.QModelIndex(), old_n, new_n - 1)
+            self._df = new
+            self._tiles.clear()
+            self.endInsertRows()
+        else:
+            self._df = new
+        if new_n and new.shape[1]:
+            self.dataChanged.emit(self.index(0, 0), self.index(new_n - 1, new.shape[1] - 1))
+        return False
+
+    def _tile(self, col: int, tile_idx: int) -> np.ndarray:
+        key = (col, tile_idx)
+        arr = self._tiles.get(key)
+        if arr is not None:
+            self._tiles.move_to_end(key)
+            return arr
+        start = tile_idx * self.TILE_ROWS
+        # str() ทีละค่าแบบ file_block (astype(str) เลือกรูปแบบวันที่ตามค่าใน tile → ต่างกันข้าม tile)
+        arr = _column_display(self._df.iloc[start:start + self.TILE_ROWS, col])
+        self._tiles[key] = arr
+        if len(self._tiles) > self.MAX_TILES:
+            self._tiles.popitem(last=False)
+        return arr
+
     def rowCount(self, parent=QtCore.QModelIndex()):
         return 0 if self._df is None else len(self._df)
 
@@ -47,77 +128,589 @@ class PandasModel(QtCore.QAbstractTableModel):
         return 0 if self._df is None else self._df.shape[1]
 
     def data(self, index, role=QtCore.Qt.DisplayRole):
+        # Qt ถาม role อื่น (alignment/background/…) ทุก cell → ตัดออกก่อนแตะ index/df
+        if role != QtCore.Qt.DisplayRole and role != QtCore.Qt.EditRole:
+            return None
         if not index.isValid() or self._df is None:
             return None
-        if role in (QtCore.Qt.DisplayRole, QtCore.Qt.EditRole):
-            val = self._df.iat[index.row(), index.column()]
-            return "" if pd.isna(val) else str(val)
-        return None
+        row = index.row()
+        tile_idx = row // self.TILE_ROWS
+        return self._tile(index.column(), tile_idx)[row - tile_idx * self.TILE_ROWS]
 
     def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
         if self._df is None or role != QtCore.Qt.DisplayRole:
             return None
         if orientation == QtCore.Qt.Horizontal:
-            try:
-                return str(self._df.columns[section])
-            except Exception:
-                return ""
+            # ชื่อคอลัมน์ str ไว้ล่วงหน้าใน set_df (header ถูกเรียกทุกครั้งที่ paint)
+            return self._colnames[section] if 0 <= section < len(self._colnames) else ""
         else:
             return section + 1
 
 
-def build_key_hash(df: pd.DataFrame, keys: List[str]) -> pd.Series:
+_FNV_OFFSET = np.uint64(0xcbf29ce484222325)
+_FNV_PRIME = np.uint64(0x100000001b3)
+# hash ประจำคีย์ที่เป็น NA (แยกจาก "" และจาก text "None"/"nan")
+_NA_KEY_HASH = hash_array(np.array(["\x00<NA>"], dtype=object), categorize=False)[0]
+
+
+def _fold_key_hashes(H: np.ndarray) -> np.ndarray:
+    """รวม hash รายคอลัมน์ (H: คีย์ × แถว) แบบ FNV-1a ซึ่งขึ้นกับลำดับคอลัมน์
+
+    XOR เฉยๆ ทำให้ (x, y) ชนกับ (y, x) และคีย์ที่ค่าสองคอลัมน์เท่ากันหักล้างกันเป็น 0 ทุกแถว
+    """
+    h = np.full(H.shape[1], _FNV_OFFSET, dtype=np.uint64)
+    for hv in H:
+        np.bitwise_xor(h, hv, out=h)
+        np.multiply(h, _FNV_PRIME, out=h)
+    return h
+
+
+# numba เป็น optional: ถ้ามีจะ fold ทุกคอลัมน์ในรอบเดียวแบบขนานตามแถว (ไม่มี array ชั่วคราว)
+try:
+    from numba import njit as _njit
+except ImportError:
+    _njit = None
+else:
+    try:
+        # serial (ไม่ใช้ parallel/prange): hash รันบน QThread ของ compare แล้ว thread pool ของ numba (tbb/omp)
+        # ที่ถูกเรียกจาก non-main thread ทำให้โปรแกรมค้างตอนปิด; loop นี้ติด memory bandwidth อยู่แล้ว
+        # nogil: ตอน hash A/B พร้อมกันใน CompareWorker อีกฝั่งทำงานต่อได้ระหว่าง fold
+        @_njit(cache=True, nogil=True)
+        def _fold_key_hashes_jit(H):
+            out = np.empty(H.shape[1], np.uint64)
+            for i in range(H.shape[1]):
+                h = np.uint64(0xcbf29ce484222325)
+                for j in range(H.shape[0]):
+                    h = (h ^ H[j, i]) * np.uint64(0x100000001b3)
+                out[i] = h
+            return out
+        _fold_key_hashes = _fold_key_hashes_jit
+    except Exception:
+        # เช่น cache=True ใช้ไม่ได้ใน build PyInstaller (ไม่มีที่เก็บ cache) → ใช้ numpy fold
+        pass
+
+
+# pandas 2.1.x: hash ของ object column แบบ categorize=True (ค่า default) ช้าแบบ polynomial บนคีย์ใหญ่
+# → ทุกจุดที่ hash ใน compare ส่ง categorize=False ตรง ๆ; เตือนครั้งเดียวถ้าเจอเวอร์ชันในช่วงนั้น
+if tuple(int(x) for x in pd.__version__.split(".")[:2] if x.isdigit()) == (2, 1):
+    warnings.warn(
+        f"pandas {pd.__version__}: key hashing ช้าผิดปกติในบางกรณี แนะนำอัปเกรดเป็น pandas>=2.2.2",
+        RuntimeWarning, stacklevel=2,
+    )
+
+
+def build_key_hash(df: pd.DataFrame, keys: List[str], treat_na_as_empty: bool = False) -> pd.Series:
+    """hash คีย์รวมต่อแถว (uint64); คีย์ที่เป็น NA ได้ hash ของตัวเอง ไม่ชนกับ "" เว้นแต่ treat_na_as_empty=True
+
+    คืน numpy uint64 ธรรมดา (ทุกแถวมีค่า ไม่ต้องมี mask ของ UInt64); ไม่มีคีย์เลย → UInt64 ที่เป็น NA ทั้งหมด
+    """
     ks = [k for k in keys if k]
     if not ks:
         return pd.Series(pd.NA, index=df.index, dtype="UInt64")
-    h = None
-    for k in ks:
-        s = df[k].astype("string[python]").fillna("")
-        hv = hash_pandas_object(s, index=False).astype("uint64").values
-        h = hv if h is None else (h ^ hv)
-    return pd.Series(h, index=df.index, dtype="UInt64")
+    H = np.empty((len(ks), len(df)), dtype=np.uint64)
+    arrow_hash, native_hash, cat_hash = _hash_arrow_key, _hash_native_key, _hash_categorical_key
+    text_hash, key_text = _hash_key_values, _key_text
+    for j, k in enumerate(ks):
+        col = df[k]
+        na = col.isna().to_numpy()
+        h = arrow_hash(col)
+        if h is None:
+            h = native_hash(col, na)
+        if h is None:
+            h = cat_hash(col)
+        if h is None:
+            h = text_hash(key_text(col, na, fill_na=treat_na_as_empty))
+        if not treat_na_as_empty and na.any():
+            h[na] = _NA_KEY_HASH
+        H[j] = h
+    return pd.Series(_fold_key_hashes(H), index=df.index, dtype=np.uint64)
+
+
+def _hash_u64(key_hash: pd.Series) -> np.ndarray:
+    """key hash เป็น uint64 ndarray; ผลปกติของ build_key_hash เป็น uint64 อยู่แล้ว → ไม่ copy
+
+    (to_numpy(na_value=...) copy ทั้ง array เสมอ แม้ไม่มี NA) ; UInt64 ที่มี NA (ไม่มีคีย์) → NA เป็น 0
+    """
+    if key_hash.dtype == np.uint64:
+        return key_hash.to_numpy()
+    return key_hash.to_numpy(dtype=np.uint64, na_value=0)
+
+
+def _preview_positions(n_rows: int, n: int = 1_000_000) -> np.ndarray:
+    """ตำแหน่งแถว (positional) สำหรับ preview: ทุกแถว หรือ n แถวที่กระจายเท่า ๆ กันถ้าเกิน n"""
+    if n_rows <= n:
+        return np.arange(n_rows)
+    return np.unique(np.linspace(0, n_rows - 1, n).astype(np.int64))
+
+
+def _numeric_ok(va: pd.Series, vb: pd.Series, abs_tol: float, pct_tol: float,
+                diff: Optional[np.ndarray] = None) -> np.ndarray:
+    """ผ่าน tolerance ไหม: |A-B| ≤ abs_tol หรือ (pct_tol > 0 และ |A-B| ≤ pct_tol × max(|A|,|B|) หรือทั้งคู่เป็น 0)
+
+    ทำบน ndarray (ไม่มี index alignment); diff = A-B ที่ผู้เรียกคำนวณไว้แล้วส่งมาได้ ไม่ต้องลบซ้ำ
+    """
+    a = np.asarray(va, dtype=np.float64)
+    b = np.asarray(vb, dtype=np.float64)
+    d = a - b if diff is None else np.asarray(diff, dtype=np.float64)
+    return _tol_mask(a, b, d, float(abs_tol), float(pct_tol))
+
+
+def _tol_mask_np(a: np.ndarray, b: np.ndarray, d: np.ndarray, abs_tol: float, pct_tol: float) -> np.ndarray:
+    d = np.abs(d)
+    ok = d <= abs_tol
+    if pct_tol > 0:
+        mx = np.maximum(np.abs(a), np.abs(b))
+        ok |= (d <= pct_tol * mx) | (mx == 0)
+    return ok
+
+
+_tol_mask = _tol_mask_np
+
+if _njit is not None:
+    try:
+        # รวม abs/max/เทียบ 3 เงื่อนไขในรอบเดียว (ไม่มี array ชั่วคราว); ไม่ใช้ fastmath เพราะ NaN ต้องไม่ผ่าน
+        # nogil: คู่ mapping อื่นใน thread pool ของ value diff ทำงานต่อได้
+        @_njit(cache=True, nogil=True)
+        def _tol_mask_jit(a, b, d, abs_tol, pct_tol):
+            out = np.empty(d.shape[0], np.bool_)
+            for i in range(d.shape[0]):
+                di = abs(d[i])
+                ok = di <= abs_tol
+                if not ok and pct_tol > 0 and di == di:  # NaN ไม่ผ่าน (max() ของ numba ไม่ส่ง NaN ต่อแบบ np.maximum)
+                    mx = max(abs(a[i]), abs(b[i]))
+                    ok = di <= pct_tol * mx or mx == 0
+                out[i] = ok
+            return out
+        _tol_mask = _tol_mask_jit
+    except Exception:
+        pass
+
+# ไม่มี numba แต่มี numexpr → ประเมินทั้งนิพจน์ทีละ block ใน C (ไม่มี array ชั่วคราวขนาดเต็มแบบ numpy)
+# แถวน้อยใช้ numpy ตามเดิม (ค่า compile/เรียก numexpr ไม่คุ้ม)
+_NUMEXPR_MIN_ROWS = 10_000
+
+if numexpr is not None and _tol_mask is _tol_mask_np:
+    def _tol_mask(a: np.ndarray, b: np.ndarray, d: np.ndarray, abs_tol: float, pct_tol: float) -> np.ndarray:
+        if len(d) < _NUMEXPR_MIN_ROWS:
+            return _tol_mask_np(a, b, d, abs_tol, pct_tol)
+        env = {"a": a, "b": b, "d": d, "abs_tol": abs_tol, "pct_tol": pct_tol}
+        if pct_tol <= 0:
+            return numexpr.evaluate("abs(d) <= abs_tol", local_dict=env)
+        # where(...) ไม่ส่ง NaN ต่อแบบ np.maximum → กัน NaN ด้วย d == d (A หรือ B เป็น NaN → d เป็น NaN → ไม่ผ่าน)
+        return numexpr.evaluate(
+            "(abs(d) <= abs_tol) | ((d == d) & ((abs(d) <= pct_tol * where(abs(a) > abs(b), abs(a), abs(b)))"
+            " | ((a == 0) & (b == 0))))",
+            local_dict=env)
+
+
+def _strip_text(s: pd.Series) -> pd.Series:
+    """ค่าเป็น text ที่ trim แล้วสำหรับ Text compare; มี pyarrow → string[pyarrow] (strip/!= ใน C++ ไม่สร้าง Python str)"""
+    if pa is None:
+        return s.astype(str).str.strip()
+    return s.astype("string[pyarrow]").str.strip()
+
+
+def _text_ne(sa: pd.Series, sb: pd.Series) -> np.ndarray:
+    """mask แถวที่ text ไม่เท่ากัน; NA ทั้งสองฝั่งถือว่าเท่ากัน, NA ฝั่งเดียวถือว่าไม่เท่า"""
+    ne = (sa != sb).to_numpy(dtype=bool, na_value=False)
+    if sa.dtype != object:
+        # to_numpy() อาจคืน view แบบ read-only (pandas copy-on-write) → ไม่ |= ลงไป
+        ne = ne | (sa.isna().to_numpy() != sb.isna().to_numpy())
+    return ne
+
+
+def _text_candidates(sa: pd.Series, sb: pd.Series) -> Optional[np.ndarray]:
+    """ตำแหน่งแถวที่ Text compare อาจไม่เท่ากัน: คอลัมน์ object ที่เป็น str ล้วนทั้งคู่ → ค่าดิบเท่ากันแล้ว trim ก็เท่ากัน
+
+    เทียบค่าดิบด้วย numpy (ไม่ต้องแปลงเป็น Arrow ทั้งคอลัมน์) แล้วให้ _strip_text/_text_ne ตัดสินเฉพาะแถวที่เหลือ
+    NA ฝั่งเดียวเป็น candidate เสมอ; คืน None ถ้าใช้ทางลัดนี้ไม่ได้ (ต้องเทียบทุกแถว)
+    ใช้เฉพาะเมื่อมี pyarrow (ทาง astype(str) เดิม NA กลายเป็น text "nan"/"None" ซึ่งความหมายต่างกัน)
+    ยกเว้น StringDtype ทั้งคู่ (คอลัมน์ text จาก read_csv แบบ numpy_nullable) ซึ่ง NA เป็น pd.NA เสมอ → ใช้ได้ทุกกรณี
+    """
+    if isinstance(sa.dtype, pd.StringDtype) and isinstance(sb.dtype, pd.StringDtype):
+        # != ของ StringDtype เทียบใน C/C++ อยู่แล้ว; NA ฝั่งเดียว → candidate, NA ทั้งคู่ → เท่ากัน
+        return np.flatnonzero(_text_ne(sa, sb))
+    if pa is None or sa.dtype != object or sb.dtype != object:
+        return None
+    if (pd.api.types.infer_dtype(sa, skipna=True) != "string"
+            or pd.api.types.infer_dtype(sb, skipna=True) != "string"):
+        return None
+    a = sa.to_numpy()
+    b = sb.to_numpy()
+    try:
+        # None == None เท่านั้นที่ได้ False ระหว่าง NA (ซึ่งก็เท่ากันจริง); NaN != NaN → เป็น candidate ให้ _text_ne ตัดสิน
+        ne = a != b
+    except TypeError:
+        # มี pd.NA (เทียบแล้วได้ NA แปลงเป็น bool ไม่ได้) → แยก NA ก่อนเทียบ
+        na_a = sa.isna().to_numpy()
+        na_b = sb.isna().to_numpy()
+        ok = ~(na_a | na_b)
+        ne = na_a != na_b
+        ne[ok] = a[ok] != b[ok]
+    return np.flatnonzero(ne)
+
+
+def _hash_arrow_key(s: pd.Series) -> Optional[np.ndarray]:
+    """คีย์ string ที่เก็บเป็น Arrow อยู่แล้ว → dictionary_encode ใน C แล้ว hash เฉพาะค่า unique
+
+    เลี่ยง astype(str) ที่ต้อง box ทุกค่าเป็น Python str; ผล hash เท่ากับทาง _key_text (NA → "")
+    คืน None ถ้าไม่มี pyarrow หรือคอลัมน์ไม่ใช่ Arrow string
+    """
+    if pa is None:
+        return None
+    dt = s.dtype
+    if isinstance(dt, pd.StringDtype):
+        if not str(dt.storage).startswith("pyarrow"):
+            return None
+    elif not (isinstance(dt, pd.ArrowDtype)
+              and (pa.types.is_string(dt.pyarrow_dtype) or pa.types.is_large_string(dt.pyarrow_dtype))):
+        return None
+    enc = pc.dictionary_encode(pc.fill_null(pa.array(s), ""))
+    if isinstance(enc, pa.ChunkedArray):
+        enc = enc.combine_chunks()
+    codes = enc.indices.to_numpy(zero_copy_only=False)
+    uniques = enc.dictionary.to_numpy(zero_copy_only=False).astype(object, copy=False)
+    return hash_array(uniques, categorize=False)[codes]
+
+
+_INTERN_SAMPLE = 10_000
+
+
+def _hash_key_values(vals: np.ndarray) -> np.ndarray:
+    """hash คีย์ text; ถ้าค่าซ้ำเยอะ (SKU/order_id) → factorize แล้ว hash เฉพาะค่า unique แล้ว take ตาม codes
+
+    ใช้ค่า text ไม่ใช่ codes ตรง ๆ เพราะ codes ของ A/B คนละชุดกัน; ผลลัพธ์เท่ากับ hash ตรงทุกค่า
+    คีย์ที่แทบไม่ซ้ำ factorize จะช้ากว่า → สุ่มดูสัดส่วน unique ก่อน
+    เฉพาะ str ล้วน: object ปนชนิด factorize รวม 1 / 1.0 / True เป็นค่าเดียว (text ต่างกัน) → hash ทีละค่า
+    """
+    if vals.dtype == object and pd.api.types.infer_dtype(vals, skipna=False) != "string":
+        return hash_array(vals, categorize=False)
+    n = len(vals)
+    if n > _INTERN_SAMPLE:
+        sample = vals[:: n // _INTERN_SAMPLE]
+        if len(pd.unique(sample)) > len(sample) // 2:
+            return hash_array(vals, categorize=False)
+    codes, uniques = pd.factorize(vals)
+    return hash_array(np.asarray(uniques, dtype=object), categorize=False)[codes]
+
+
+_EMPTY_KEY_HASH = hash_array(np.array([""], dtype=object), categorize=False)[0]
+
+
+def _hash_native_key(s: pd.Series, na: Optional[np.ndarray] = None) -> Optional[np.ndarray]:
+    """คีย์ int/uint/bool/float (numpy หรือ Int64/boolean/Float64) → factorize บนค่าดิบใน C แล้วแปลงเป็น text เฉพาะค่า unique
+
+    ผล hash เท่ากับทาง _key_text ทุกค่า (NA → hash ของ "") จึงยังจับคู่กับอีกฝั่งที่เป็น string ได้
+    float factorize บน bit pattern (factorize ค่า float รวม 0.0/-0.0 เป็นค่าเดียวแต่ text ต่างกัน)
+    คืน None ถ้าไม่ใช่ dtype ที่รองรับ หรือค่าแทบไม่ซ้ำ (factorize ไม่ช่วย)
+    """
+    kind = s.dtype.kind
+    if kind not in "iub" and not (kind == "f" and s.dtype.itemsize == 8):  # float32 → text ต่างจาก float64
+        return None
+    n = len(s)
+    if n > _INTERN_SAMPLE:
+        sample = s.iloc[:: n // _INTERN_SAMPLE]
+        if sample.nunique(dropna=False) > len(sample) // 2:
+            return None
+    if kind != "f":
+        codes, uniques = pd.factorize(s)
+        return _hash_codes(codes, pd.Series(uniques).astype(str).to_numpy(dtype=object))
+    if na is None:
+        na = s.isna().to_numpy()
+    vals = s.to_numpy(dtype=np.float64, na_value=np.nan)
+    codes, ubits = pd.factorize(vals.view(np.uint64))
+    codes[na] = -1
+    return _hash_codes(codes, pd.Series(ubits.view(np.float64)).astype(str).to_numpy(dtype=object))
+
+
+def _hash_categorical_key(s: pd.Series) -> Optional[np.ndarray]:
+    """คีย์ที่เป็น category อยู่แล้ว → hash เฉพาะ categories (ในรูป text แบบ _key_text) แล้ว take ตาม codes"""
+    if not isinstance(s.dtype, pd.CategoricalDtype):
+        return None
+    cats = s.cat.categories
+    return _hash_codes(s.cat.codes.to_numpy(), _key_text(pd.Series(cats, dtype=cats.dtype)))
+
+
+def _hash_codes(codes: np.ndarray, uniques_text: np.ndarray) -> np.ndarray:
+    """hash ค่า unique (text) ครั้งเดียวแล้วกระจายตาม codes; code -1 (NA) → hash ของ "" เหมือน _key_text"""
+    out = hash_array(uniques_text, categorize=False).take(codes)
+    miss = codes < 0
+    if miss.any():
+        out[miss] = _EMPTY_KEY_HASH
+    return out
+
+
+def _key_text(s: pd.Series, na: Optional[np.ndarray] = None, fill_na: bool = True) -> np.ndarray:
+    """คีย์ในรูป text (object ndarray) ให้ A/B ที่ dtype ต่างกัน (เช่น int vs str) ยังจับคู่กันได้
+
+    fill_na=True → NA เป็น "" ; False → ปล่อยค่าที่ตำแหน่ง NA ไว้ (ผู้เรียกเขียน hash ของ NA ทับเอง ไม่ต้อง copy อีกรอบ)
+    """
+    if na is None:
+        na = s.isna().to_numpy()
+    if s.dtype == object and not na.any():
+        return s.to_numpy()
+    out = s.astype(str)
+    if fill_na and na.any():
+        out = out.where(~na, "")
+    return out.to_numpy(dtype=object)
+
+
+# "1,234" → "1234", "(50)" → "-50" ในรอบเดียว (แทน str.replace สามรอบ)
+_NUMERIC_TRANS = str.maketrans({",": "", "(": "-", ")": ""})
 
 
 def safe_numeric(s: pd.Series) -> pd.Series:
-    s = s.astype(str).str.replace(",", "", regex=False)
-    s = s.str.replace("(", "-", regex=False).str.replace(")", "", regex=False)
+    # เป็นตัวเลขอยู่แล้ว (รวม Int64/Float64) ไม่ต้องวนผ่าน string; dtype ผลลัพธ์เหมือนทางปกติ
+    # (int → int64, มี NA หรือทศนิยม → float64 ที่ NA เป็น NaN)
+    if s.dtype.kind in "iu":
+        return s.astype("float64") if s.hasnans else s.astype("int64")
+    if s.dtype.kind == "f":
+        return s.astype("float64")
+    # ยอดเงินจากไฟล์ซ้ำกันเยอะ → แปลงเฉพาะค่า unique แล้ว take ตาม codes (แบบ _hash_key_values)
+    # เฉพาะคอลัมน์ string ล้วน: object ปนชนิด factorize จะรวม 1 / 1.0 / True เป็นค่าเดียว
+    n = len(s)
+    if n > _INTERN_SAMPLE and pd.api.types.infer_dtype(s, skipna=True) == "string":
+        sample = s.iloc[:: n // _INTERN_SAMPLE]
+        if sample.nunique() <= len(sample) // 2:
+            codes, uniques = pd.factorize(s)
+            parsed = _parse_numeric_text(pd.Series(uniques)).to_numpy()
+            miss = codes < 0
+            if miss.any():
+                parsed = parsed.astype(np.float64, copy=False)
+                vals = parsed.take(codes)
+                vals[miss] = np.nan
+            else:
+                vals = parsed.take(codes)
+            return pd.Series(vals, index=s.index, name=s.name)
+    return _parse_numeric_text(s)
+
+
+# ตัวเลขธรรมดา (หลังตัด , และแปลงวงเล็บแล้ว) ที่ Arrow cast ได้ผลเดียวกับ pd.to_numeric
+# hex / inf / nan / มีช่องว่าง ฯลฯ ไม่เข้า pattern → ให้ pandas จัดการทั้งคอลัมน์ตามเดิม
+_NUMERIC_RE = r"^[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?$"
+_INTEGER_RE = r"^[+-]?\d+$"
+
+
+def _parse_numeric_arrow(s: pd.Series) -> Optional[np.ndarray]:
+    """แปลงคอลัมน์ string ล้วนด้วย Arrow compute (C++ ไม่ถือ GIL) แทน str.translate ทีละค่า + to_numeric
+
+    ได้ dtype เหมือน to_numeric (จำนวนเต็มล้วนไม่มีค่าว่าง → int64, นอกนั้น float64)
+    คืน None ถ้ามีค่าที่ไม่ใช่ตัวเลขธรรมดา / int เกิน int64 / float overflow → ใช้ทาง pandas
+    """
+    arr = pa.array(s, type=pa.string(), from_pandas=True)
+    arr = pc.replace_substring(arr, ",", "")
+    arr = pc.replace_substring(arr, ")", "")
+    arr = pc.replace_substring(arr, "(", "-")
+    if not pc.all(pc.match_substring_regex(arr, _NUMERIC_RE)).as_py():
+        return None
+    try:
+        if arr.null_count == 0 and pc.all(pc.match_substring_regex(arr, _INTEGER_RE)).as_py():
+            return pc.cast(pc.replace_substring(arr, "+", ""), pa.int64()).to_numpy()
+        out = pc.cast(arr, pa.float64()).to_numpy(zero_copy_only=False)
+    except pa.ArrowInvalid:
+        return None
+    if np.isinf(out).any():
+        return None
+    return out
+
+
+def _parse_numeric_text(s: pd.Series) -> pd.Series:
+    if pa is not None and len(s) and pd.api.types.infer_dtype(s, skipna=True) == "string":
+        vals = _parse_numeric_arrow(s)
+        if vals is not None:
+            return pd.Series(vals, index=s.index, name=s.name)
+    s = s.astype(str).str.translate(_NUMERIC_TRANS)
     return pd.to_numeric(s, errors="coerce")
 
 
+def _first_positions(h: np.ndarray) -> np.ndarray:
+    """ตำแหน่งแรกของแต่ละค่า (เรียงตามลำดับเดิม) – hash table ของ pandas O(n) เร็วกว่า np.unique ที่ต้อง sort 3-10×"""
+    return np.flatnonzero(~pd.Series(h, copy=False).duplicated().to_numpy())
+
+
 def hash_to_keyrows(df: pd.DataFrame, keys: List[str], key_hash: pd.Series) -> pd.DataFrame:
     ks = [k for k in keys if k]
     if not ks:
         return pd.DataFrame(columns=["h"])
-    tmp = pd.DataFrame({"h": key_hash})
+    # แถวแรกของแต่ละ hash (เรียงตามลำดับในไฟล์) แล้วจัดรูปคีย์เฉพาะแถวเหล่านั้น
+    h = _hash_u64(key_hash)
+    if key_hash.dtype == np.uint64:  # ไม่มี NA → ไม่ต้องกรอง/สร้างสำเนา
+        first = _first_positions(h)
+        rows = first
+    else:
+        valid = np.flatnonzero(key_hash.notna().to_numpy())
+        h = h[valid]
+        first = _first_positions(h)
+        rows = valid[first]
+    tmp = {"h": h[first]}
+    fmt = _format_key_values
     for k in ks:
-        col = df[k]
-        def fmt(v):
-            if pd.isna(v):
-                return pd.NA
-            if isinstance(v, float):
-                return str(int(v)) if v.is_integer() else str(v)
-            return str(v)
-        tmp[k] = col.map(fmt)
-    tmp = tmp.dropna(subset=["h"]).drop_duplicates(subset=["h"], keep="first")
-    tmp["h"] = tmp["h"].astype("uint64")
-    return tmp
+        tmp[k] = fmt(df[k].iloc[rows])
+    return pd.DataFrame(tmp)
+
+
+def _format_key_values(col: pd.Series) -> np.ndarray:
+    """ค่าคีย์สำหรับแสดงผล (object ndarray): float ที่เป็นจำนวนเต็มแสดงแบบ int ("123" ไม่ใช่ "123.0"), NA → pd.NA"""
+    na = col.isna().to_numpy()
+    if col.dtype.kind == "f":
+        a = col.to_numpy(dtype=np.float64, na_value=np.nan)
+        whole = np.isfinite(a) & (a == np.trunc(a))
+        small = whole & (np.abs(a) < 2.0 ** 63)
+        out = a.astype(str).astype(object)
+        out[small] = a[small].astype(np.int64).astype(str)
+        for p in np.flatnonzero(whole & ~small):  # ≥ 2**63 ไม่พอ int64 → int ของ Python (แบบ object ด้านล่าง)
+            out[p] = str(int(a[p]))
+    elif col.dtype == object and pd.api.types.infer_dtype(col, skipna=True) not in ("string", "empty"):
+        # object ปนหลายชนิด (เช่น float ปน str จาก Excel): str ทุกค่าก่อน แล้วแก้เฉพาะ float ที่เป็นจำนวนเต็ม
+        # หา float ด้วย map(isinstance) (builtin ไม่มี Python frame ต่อค่า) แทน col.map(fmt) ทีละค่า
+        vals = col.to_numpy(dtype=object)
+        out = col.astype(str).to_numpy(dtype=object, copy=True)
+        is_float = np.fromiter(map(isinstance, vals, repeat(float)), dtype=bool, count=len(vals))
+        fpos = np.flatnonzero(is_float & ~na)
+        if len(fpos):
+            a = vals[fpos].astype(np.float64)
+            whole = np.isfinite(a) & (a == np.trunc(a))
+            small = whole & (np.abs(a) < 2.0 ** 63)
+            out[fpos[small]] = a[small].astype(np.int64).astype(str)
+            for p in fpos[whole & ~small]:  # ≥ 2**63 ไม่พอ int64 (มีน้อยมาก) → int ของ Python
+                out[p] = str(int(vals[p]))
+    else:
+        out = col.astype(str).to_numpy(dtype=object, copy=True)
+    out[na] = pd.NA
+    return out
+
+
+def _isin_u64(values: np.ndarray, test: np.ndarray) -> np.ndarray:
+    """mask ว่า values (uint64) อยู่ใน test ไหม – hashtable ของ pandas O(n+m) แทน np.isin ที่ sort ทั้งสองฝั่ง"""
+    return pd.Series(values, copy=False).isin(test).to_numpy()
+
+
+def _match_unique_u64(a: np.ndarray, b: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """(a อยู่ใน b, b อยู่ใน a) สำหรับ uint64 ที่ไม่ซ้ำทั้งสองฝั่ง (เช่น keyrows["h"])
+
+    สร้าง hash table บน b ครั้งเดียวด้วย get_indexer แล้วได้ mask ฝั่ง b จากตำแหน่งที่เจอ
+    แทน isin สองรอบที่สร้าง hash table สองชุด (~1.7× เร็วกว่า)
+    """
+    pos = pd.Index(b, copy=False).get_indexer(a)
+    a_in_b = pos >= 0
+    b_in_a = np.zeros(len(b), dtype=bool)
+    b_in_a[pos[a_in_b]] = True
+    return a_in_b, b_in_a
 
 
 def df_from_keys_with_keycols(name: str, keys_iter: Iterable[int], keyrows: pd.DataFrame, key_colnames: List[str]) -> pd.DataFrame:
-    lst = list(keys_iter)
-    if not lst:
+    # อ่าน iterator รอบเดียวเป็น uint64 array (ไม่ต้อง list() แล้ว int() ซ้ำ)
+    sel = keys_iter if isinstance(keys_iter, np.ndarray) else np.fromiter(keys_iter, dtype=np.uint64)
+    if sel.size == 0:
         cols = key_colnames + [f"{name}_key"]
         return pd.DataFrame(columns=cols)
-    ref = keyrows.set_index("h")
-    sel = pd.Index([int(x) for x in lst])
-    joined = ref.loc[ref.index.intersection(sel)].copy()
-    joined[f"{name}_key"] = joined.index.astype("uint64")
-    return joined[key_colnames + [f"{name}_key"]].reset_index(drop=True)
+    # keyrows มี h ไม่ซ้ำอยู่แล้ว → mask ด้วย hash lookup แล้วหยิบ numpy array ตรง ๆ (คงลำดับตาม keyrows)
+    return keyrows_take(name, keyrows, _isin_u64(keyrows["h"].to_numpy(dtype=np.uint64), sel), key_colnames)
+
+
+def keyrows_take(name: str, keyrows: pd.DataFrame, sel: np.ndarray, key_colnames: List[str]) -> pd.DataFrame:
+    """แถวของ keyrows ตาม mask/ตำแหน่ง sel → ตาราง key columns + {name}_key (ไม่ต้องค้นด้วย hash ซ้ำ)"""
+    ref_h = keyrows["h"].to_numpy(dtype=np.uint64)
+    out = {k: keyrows[k].to_numpy()[sel] for k in key_colnames}
+    out[f"{name}_key"] = ref_h[sel]
+    return pd.DataFrame(out)
 
 
 # =============================
 # Mapping Dialog (new)
 # =============================
+class _PairsModel(QtCore.QAbstractTableModel):
+    """model ของตารางคู่คอลัมน์ – อ่านจาก list ของ dialog โดยตรง (ไม่สร้าง item ต่อ cell)
+
+    เพิ่ม/ลบแจ้ง view เฉพาะแถวที่เปลี่ยน (beginInsertRows / beginRemoveRows) ไม่ต้องเติมตารางใหม่ทั้งหมด
+    """
+    HEADERS = ("A column", "B column", "Type")
+
+    def __init__(self, pairs: List[Tuple[str,str,str]], parent=None):
+        super().__init__(parent)
+        self._pairs = pairs
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self._pairs)
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else 3
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if role != QtCore.Qt.DisplayRole or not index.isValid():
+            return None
+        return self._pairs[index.row()][index.column()]
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if role != QtCore.Qt.DisplayRole:
+            return None
+        if orientation == QtCore.Qt.Horizontal:
+            return self.HEADERS[section]
+        return str(section + 1)
+
+    def append_pair(self, pair: Tuple[str,str,str]):
+        n = len(self._pairs)
+        self.beginInsertRows(QtCore.QModelIndex(), n, n)
+        self._pairs.append(pair)
+        self.endInsertRows()
+
+    def remove_rows(self, rows: Iterable[int]):
+        for r in sorted(set(rows), reverse=True):
+            if 0 <= r < len(self._pairs):
+                self.beginRemoveRows(QtCore.QModelIndex(), r, r)
+                self._pairs.pop(r)
+                self.endRemoveRows()
+
+
+class _PreviewWorker(QtCore.QObject):
+    """hash คีย์สำหรับ preview ของ MappingDialog – รันบน QThread แยก (hash B เต็มไฟล์ใช้เวลาหลายวินาทีบนไฟล์ใหญ่)
+
+    finished((rows_a, rows_b, n_sample), built_b) → built_b = (key_hash, keyrows) ของ B ที่เพิ่ง hash (None ถ้าใช้ cache)
+    failed(str) → ข้อความ error
+    """
+    finished = QtCore.pyqtSignal(object, object)
+    failed = QtCore.pyqtSignal(str)
+
+    def __init__(self, preview_data: Tuple[pd.DataFrame, List[str], pd.DataFrame, List[str]],
+                 hash_a: Optional[pd.Series], hash_b: Optional[pd.Series]):
+        super().__init__()
+        self._data = preview_data
+        self._hash_a, self._hash_b = hash_a, hash_b
+
+    @QtCore.pyqtSlot()
+    def run(self):
+        try:
+            res = self._run()
+        except Exception as e:
+            self.failed.emit(str(e))
+            return
+        finally:
+            self._data = self._hash_a = self._hash_b = None
+        self.finished.emit(*res)
+
+    def _run(self):
+        """ตำแหน่งแถว (positional) ของ A (sample) และแถวแรกใน B ที่คีย์ตรงกัน
+
+        สุ่มเฉพาะ A แล้วค้นใน hash เต็มของ B (ถ้าสุ่มทั้งสองฝั่ง คีย์ของ A ต้องติด sample ของ B ด้วย → % ตรงกันต่ำกว่าจริง)
+        """
+        df_a, keys_a, df_b, keys_b = self._data
+        pos_a = _preview_positions(len(df_a))
+        if self._hash_a is not None:
+            ha = _hash_u64(self._hash_a)[pos_a]
+        else:
+            ha = _hash_u64(build_key_hash(df_a.iloc[pos_a], keys_a))
+        built_b = None
+        hb = self._hash_b
+        if hb is None:
+            hb = build_key_hash(df_b, keys_b)
+            built_b = (hb, hash_to_keyrows(df_b, keys_b, hb))
+        hb_v = _hash_u64(hb)
+        first = _first_positions(hb_v)
+        pos = pd.Index(hb_v[first]).get_indexer(ha)
+        hit = pos >= 0
+        return (pos_a[hit], first[pos[hit]], len(pos_a)), built_b
+
+
 class MappingDialog(QtWidgets.QDialog):
     """
     เลือกจับคู่คอลัมน์ A↔B และตั้ง tolerance
@@ -125,8 +718,13 @@ class MappingDialog(QtWidgets.QDialog):
       {'pairs': [(a_col, b_col, typ), ...], 'abs_tol': float, 'pct_tol': float}
       typ ∈ {'Numeric','Text'}
     """
+    _PREVIEW_DEBOUNCE_MS = 200
+
     def __init__(self, cols_a: List[str], cols_b: List[str], init_pairs: List[Tuple[str,str,str]] = None,
-                 abs_tol: float = 0.0, pct_tol: float = 0.0, parent=None):
+                 abs_tol: float = 0.0, pct_tol: float = 0.0, parent=None,
+                 preview_data: Optional[Tuple[pd.DataFrame, List[str], pd.DataFrame, List[str]]] = None,
+                 preview_hash_a: Optional[pd.Series] = None,
+                 preview_hash_b: Optional[pd.Series] = None):
         super().__init__(parent)
         self.setWindowTitle("Column Mapping & Tolerance")
         self.resize(720, 520)
@@ -155,9 +753,11 @@ class MappingDialog(QtWidgets.QDialog):
         grid.addWidget(self.cmb_t, 0, 5)
         grid.addWidget(self.btn_add, 0, 6)
 
-        # table of pairs
-        self.tbl = QtWidgets.QTableWidget(0, 3)
-        self.tbl.setHorizontalHeaderLabels(["A column","B column","Type"])
+        # table of pairs (view บน self._pairs โดยตรง)
+        self.tbl = QtWidgets.QTableView()
+        self._pairs_model = _PairsModel(self._pairs, self)
+        self.tbl.setModel(self._pairs_model)
+        self.tbl.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
         self.tbl.horizontalHeader().setStretchLastSection(True)
         grid.addWidget(self.tbl, 1, 0, 1, 7)
 
@@ -172,25 +772,104 @@ class MappingDialog(QtWidgets.QDialog):
         tl.addWidget(QtWidgets.QLabel("Percent of max(|A|,|B|) (≤ %)"), 0, 2); tl.addWidget(self.sp_pct, 0, 3)
         grid.addWidget(tolbox, 3, 0, 1, 7)
 
+        # preview (โดยประมาณ จาก sample) – อัปเดตตอนปรับ tolerance
+        self.lbl_preview = QtWidgets.QLabel("")
+        self.lbl_preview.setWordWrap(True)
+        grid.addWidget(self.lbl_preview, 4, 0, 1, 7)
+
         # buttons
         bb = QtWidgets.QDialogButtonBox(QtWidgets.QDialogButtonBox.Ok | QtWidgets.QDialogButtonBox.Cancel)
-        grid.addWidget(bb, 4, 0, 1, 7)
+        grid.addWidget(bb, 5, 0, 1, 7)
 
         self.btn_add.clicked.connect(self._on_add)
         self.btn_del.clicked.connect(self._on_del)
         bb.accepted.connect(self.accept)
         bb.rejected.connect(self.reject)
 
-        self._reload_table()
-
-    def _reload_table(self):
-        self.tbl.setRowCount(0)
-        for a,b,t in self._pairs:
-            r = self.tbl.rowCount()
-            self.tbl.insertRow(r)
-            self.tbl.setItem(r, 0, QtWidgets.QTableWidgetItem(a))
-            self.tbl.setItem(r, 1, QtWidgets.QTableWidgetItem(b))
-            self.tbl.setItem(r, 2, QtWidgets.QTableWidgetItem(t))
+        self._preview_data = preview_data
+        self._preview_match: Optional[Tuple[np.ndarray, np.ndarray, int]] = None
+        self._preview_vals: Dict[Tuple[str, str], Tuple[pd.Series, pd.Series]] = {}
+        # (key_hash, keyrows) ของ B ที่ worker เพิ่ง hash → ผู้เปิด dialog เก็บลง cache ของ FileBlock ได้หลังปิด
+        self.preview_built_b: Optional[Tuple[pd.Series, pd.DataFrame]] = None
+        self._preview_job: Optional[Tuple[QtCore.QThread, _PreviewWorker]] = None
+        # เทียบค่ารันบน GUI thread → รวมการแก้ติด ๆ กัน (หมุน spinbox / เพิ่มลบคู่) เป็นการคำนวณครั้งเดียว
+        self._preview_timer = QtCore.QTimer(self)
+        self._preview_timer.setSingleShot(True)
+        self._preview_timer.setInterval(self._PREVIEW_DEBOUNCE_MS)
+        self._preview_timer.timeout.connect(self._update_preview)
+        self.sp_abs.valueChanged.connect(self._schedule_preview)
+        self.sp_pct.valueChanged.connect(self._schedule_preview)
+
+        if preview_data is not None:
+            # hash คีย์ (A sample + B เต็มไฟล์ ถ้ายังไม่มี cache) บน QThread → dialog ใช้งานได้ทันที
+            self.lbl_preview.setText("Preview: กำลังคำนวณ…")
+            worker = _PreviewWorker(preview_data, preview_hash_a, preview_hash_b)
+            thread = QtCore.QThread(self)
+            worker.moveToThread(thread)
+            thread.started.connect(worker.run)
+            worker.finished.connect(self._on_preview_hashed)
+            worker.failed.connect(self._on_preview_failed)
+            worker.finished.connect(thread.quit)
+            worker.failed.connect(thread.quit)
+            thread.finished.connect(worker.deleteLater)
+            thread.finished.connect(thread.deleteLater)
+            self._preview_job = (thread, worker)
+            thread.start()
+
+    def _schedule_preview(self, *args):
+        self._preview_timer.start()
+
+    def _on_preview_hashed(self, match, built_b):
+        self._preview_job = None
+        self._preview_match = match
+        self.preview_built_b = built_b
+        self._update_preview()
+
+    def _on_preview_failed(self, msg: str):
+        self._preview_job = None
+        self._preview_data = None
+        self.lbl_preview.setText(f"Preview: คำนวณไม่สำเร็จ ({msg})")
+
+    def done(self, r):
+        # ปิด dialog ระหว่าง hash → ไม่รอบน GUI thread: ตัดสัญญาณเข้า dialog แล้วถอด thread ไปให้จบเอง
+        if self._preview_job is not None:
+            thread, worker = self._preview_job
+            worker.finished.disconnect(self._on_preview_hashed)
+            worker.failed.disconnect(self._on_preview_failed)
+            thread.quit()
+            _detach_job(self._preview_job)
+            self._preview_job = None
+        super().done(r)
+
+    def _update_preview(self, *args):
+        if self._preview_match is None or self._preview_data is None:
+            return
+        try:
+            self._show_preview()
+        except Exception as e:
+            self.lbl_preview.setText(f"Preview: คำนวณไม่สำเร็จ ({e})")
+
+    def _show_preview(self):
+        rows_a, rows_b, n_sample = self._preview_match
+        df_a, _, df_b, _ = self._preview_data
+        abs_tol = float(self.sp_abs.value())
+        pct_tol = float(self.sp_pct.value()) / 100.0
+        n_bad = 0
+        for a, b, t in self._pairs:
+            if t != "Numeric" or a not in df_a.columns or b not in df_b.columns:
+                continue
+            if (a, b) not in self._preview_vals:
+                self._preview_vals[(a, b)] = (
+                    safe_numeric(df_a[a].iloc[rows_a]).reset_index(drop=True),
+                    safe_numeric(df_b[b].iloc[rows_b]).reset_index(drop=True),
+                )
+            va, vb = self._preview_vals[(a, b)]
+            n_bad += int((~_numeric_ok(va, vb, abs_tol, pct_tol)).sum())
+        approx = "≈ " if n_sample < len(df_a) else ""
+        self.lbl_preview.setText(
+            f"Preview: {approx}{len(rows_a):,} / {n_sample:,} A rows match B; "
+            f"{approx}{n_bad:,} numeric diffs beyond tolerance"
+        )
 
     def _on_add(self):
         a = self.cmb_a.currentText().strip()
@@ -199,15 +878,12 @@ class MappingDialog(QtWidgets.QDialog):
         if not a or not b: return
         pair = (a,b,t)
         if pair not in self._pairs:
-            self._pairs.append(pair)
-            self._reload_table()
+            self._pairs_model.append_pair(pair)
+            self._schedule_preview()
 
     def _on_del(self):
-        rows = sorted(set([idx.row() for idx in self.tbl.selectedIndexes()]), reverse=True)
-        for r in rows:
-            if 0 <= r < len(self._pairs):
-                self._pairs.pop(r)
-        self._reload_table()
+        self._pairs_model.remove_rows(idx.row() for idx in self.tbl.selectedIndexes())
+        self._schedule_preview()
 
     def result(self) -> Dict:
         return {
@@ -218,122 +894,1054 @@ class MappingDialog(QtWidgets.QDialog):
 
 
 # =============================
-# Main Window
+# Compare worker (background thread)
 # =============================
-class CompareWindow(QtWidgets.QMainWindow):
-    requestHome = QtCore.pyqtSignal()
+def _dup_df(s: pd.Series, label: str) -> pd.DataFrame:
+    """คีย์ที่ซ้ำ (count > 1) เรียงจากซ้ำมากสุด – สร้าง frame ครั้งเดียว ไม่ reset/rename/insert ต่อกัน
 
-    def __init__(self, parent=None):
-        super().__init__(parent)
-        self.setWindowTitle("Compare Files – Reconcile GUI")
-        self.resize(1320, 860)
-
-        # data holders
-        self.df_a: Optional[pd.DataFrame] = None
-        self.df_b: Optional[pd.DataFrame] = None
-        self.df_a_agg: Optional[pd.DataFrame] = None
-        self.df_b_agg: Optional[pd.DataFrame] = None
+    นับแบบ hash ไม่ sort (sort=False) แล้วค่อย sort เฉพาะคีย์ที่ซ้ำ (ปกติน้อยกว่าทั้งหมดมาก);
+    stable sort → คีย์ที่ซ้ำเท่ากันเรียงตามลำดับที่พบในไฟล์
+    """
+    vc = s.value_counts(dropna=False, sort=False)
+    vc = vc[vc.to_numpy() > 1]
+    if vc.empty:
+        return pd.DataFrame(columns=["file", "key", "count"])
+    vc = vc.sort_values(ascending=False, kind="stable")
+    return pd.DataFrame({
+        "file": label,
+        "key": pd.array(vc.index, dtype="UInt64"),
+        "count": vc.array,
+    })
+
+
+def _concat_columns(parts: List[Dict[str, object]], columns: List[str]) -> pd.DataFrame:
+    """ต่อผลหลายชิ้น (dict คอลัมน์ → array) ทีละคอลัมน์ แล้วทิ้งชิ้นของคอลัมน์นั้นทันที
+
+    peak memory ≈ ผลลัพธ์ + หนึ่งคอลัมน์ แทน (ทุก frame + สำเนาจาก pd.concat); dtype ได้แบบเดียวกับ pd.concat
+    """
+    out = {}
+    for c in columns:
+        out[c] = pd.concat([pd.Series(p.pop(c), copy=False) for p in parts], ignore_index=True)
+    return pd.DataFrame(out, columns=columns, copy=False)
+
+
+# Summary card: HTML แบบ flat (มีแต่ class) + stylesheet ตั้งครั้งเดียวที่ txt_summary.document()
+# → ตอน compare แค่ .format ตัวเลข และ setHtml ไม่ต้อง parse inline style ซ้ำทุก element
+_SUMMARY_CSS = """
+.wrap { font-family: Segoe UI, Roboto, Arial; line-height: 1.6; }
+.status { padding: 12px 16px; margin-bottom: 12px; border-width: 2px; border-style: solid; }
+.status-ok { background-color: #e7f8f2; border-color: #10b981; }
+.status-partial { background-color: #fef4e3; border-color: #f59e0b; }
+.status-none { background-color: #fde9e9; border-color: #ef4444; }
+.title { font-size: 18px; font-weight: 700; }
+.sub { margin-top: 4px; color: #555; font-size: 13px; }
+.card { padding: 12px; border: 1px solid #ddd; background-color: #f9fafb; }
+.label { font-size: 12px; color: #6b7280; font-weight: 600; }
+.big { font-size: 28px; font-weight: 700; margin: 8px 0; }
+.small { font-size: 11px; color: #666; }
+.ok { color: #10b981; }
+.partial { color: #f59e0b; }
+.none { color: #ef4444; }
+.keys { margin: 12px 0; padding: 10px; background-color: #f0f4f8; font-size: 12px; color: #333; }
+code { background-color: #fff; padding: 2px 6px; }
+.hint { margin-top: 8px; padding: 8px; border-left: 3px solid #2563eb; background-color: #eff6ff; font-size: 11px; color: #555; }
+"""
 
-        # results
-        self._summary_html: str = ""
-        self._only_a_df: Optional[pd.DataFrame] = None
-        self._only_b_df: Optional[pd.DataFrame] = None
-        self._both_df: Optional[pd.DataFrame] = None
-        self._dup_a_df: Optional[pd.DataFrame] = None
-        self._dup_b_df: Optional[pd.DataFrame] = None
-        self._valdiff_df: Optional[pd.DataFrame] = None  # NEW
+_SUMMARY_HTML_TEMPLATE = """
+<div class='wrap'>
+<div class='status status-{cls}'>
+<div class='title {cls}'>{status}</div>
+<div class='sub'>หลังจากใช้ตัวกรอง และการรวมข้อมูล (ถ้ามี)</div>
+</div>
+<table width='100%' cellspacing='12'><tr>
+<td class='card' width='33%'><div class='label'>ไฟล์ 1 ตรงกับไฟล์ 2</div>
+<div class='big {cls}'>{pct_a:.1f}%</div>
+<div class='small'>คีย์เฉพาะ = {total_a:,} แถว</div></td>
+<td class='card' width='33%'><div class='label'>ไฟล์ 2 ตรงกับไฟล์ 1</div>
+<div class='big {cls}'>{pct_b:.1f}%</div>
+<div class='small'>คีย์เฉพาะ = {total_b:,} แถว</div></td>
+<td class='card' width='33%'><div class='label'>ความคล้ายคลึง (Jaccard)</div>
+<div class='big {cls}'>{jacc:.1f}%</div>
+<div class='small'>ตรงกัน {inter:,} / รวม {union:,}</div></td>
+</tr></table>
+<div class='keys'><b>คีย์ที่ใช้:</b><br/>
+📄 ไฟล์ 1: <code>{key_list_a}</code><br/>
+📄 ไฟล์ 2: <code>{key_list_b}</code></div>
+<div class='hint'>💡 ตัวอย่าง "ตรงกัน" จำกัดที่ {sample:,} คีย์เพื่อให้เร็ว | ใช้ "ส่งออก" เพื่อดูผลเต็ม</div>
+</div>
+"""
 
-        # mapping & tolerance (NEW)
-        self._map_pairs: List[Tuple[str,str,str]] = []  # (a_col, b_col, 'Numeric'|'Text')
-        self._abs_tol: float = 0.0
-        self._pct_tol: float = 0.0
 
-        # UI
-        self._stack = QtWidgets.QStackedWidget()
-        self.setCentralWidget(self._stack)
-        self._status = self.statusBar()
-        self._status.showMessage("Ready – Load A/B and set keys")
+class _CompareCancelled(Exception):
+    """CompareWorker.cancel() ถูกเรียกระหว่างงาน – หยุดที่จุดตรวจถัดไป"""
 
-        # progress tracking
-        self._prog_task: Optional[str] = None
-        self._prog_total: int = 0
-        self._prog_step: int = 0
-        self._prog_t0: float = 0.0
 
-        self._build_page_setup()
-        self._build_page_results()
-        self._stack.setCurrentWidget(self.page_setup)
+class CompareWorker(QtCore.QObject):
+    """งาน compare ทั้งหมด (hash / set ops / value diff / summary) – รันบน QThread แยก ห้ามแตะ widget
 
-    # ------------- busy ctx -------------
-    @contextmanager
-    def _busy(self, text: str, done: str = "Done ✅"):
-        QtWidgets.QApplication.setOverrideCursor(QtCore.Qt.WaitCursor)
-        t0 = time.time()
-        self._status.showMessage(f"{text}…")
-        QtWidgets.QApplication.processEvents()
+    progress(step_inc, note) → status bar ฝั่ง UI; finished(dict) → ผลลัพธ์ทั้งหมด; failed(str) → ข้อความ error
+    cancelled() → หยุดกลางทางเพราะ cancel() (เช่นปิดหน้าต่าง)
+    """
+    progress = QtCore.pyqtSignal(int, str)
+    finished = QtCore.pyqtSignal(object)
+    failed = QtCore.pyqtSignal(str)
+    cancelled = QtCore.pyqtSignal()
+
+    CHUNK_SIZE = 1_000_000  # ก้อน 50k ทำให้ hash ช้าลง ~50% (factorize/sampling ซ้ำทุกก้อน)
+    SAMPLE = 5000
+
+    def __init__(self, df_a: pd.DataFrame, df_b: pd.DataFrame, keys_a: List[str], keys_b: List[str],
+                 map_pairs: List[Tuple[str,str,str]], abs_tol: float, pct_tol: float,
+                 cached_a: Optional[Tuple[pd.Series, pd.DataFrame]] = None,
+                 cached_b: Optional[Tuple[pd.Series, pd.DataFrame]] = None):
+        super().__init__()
+        self.df_a, self.df_b = df_a, df_b
+        self.keys_a, self.keys_b = keys_a, keys_b
+        self._map_pairs = list(map_pairs)
+        self._abs_tol = abs_tol
+        self._pct_tol = pct_tol
+        self.cached_a, self.cached_b = cached_a, cached_b
+        self._cancel = False
+
+    def cancel(self):
+        """เรียกจาก UI thread ได้ – run() ตรวจ flag ระหว่างขั้น (ทุก chunk / ทุกคู่ mapping) แล้วหยุด"""
+        self._cancel = True
+
+    def _check_cancel(self):
+        if self._cancel:
+            raise _CompareCancelled()
+
+    def total_steps(self) -> int:  # เรียกก่อน run (run ปล่อย df_a/df_b เมื่อจบ)
+        n_a = (len(self.df_a) + self.CHUNK_SIZE - 1) // self.CHUNK_SIZE
+        n_b = (len(self.df_b) + self.CHUNK_SIZE - 1) // self.CHUNK_SIZE
+        return 4 + n_a + n_b + len(self._map_pairs)
+
+    @QtCore.pyqtSlot()
+    def run(self):
         try:
-            yield
+            res = self._run()
+        except _CompareCancelled:
+            self.cancelled.emit()
+            return
+        except Exception as e:
+            self.failed.emit(str(e))
+            return
         finally:
-            QtWidgets.QApplication.restoreOverrideCursor()
-            dt = time.time() - t0
-            self._status.showMessage(f"{done} ({dt:.2f}s)")
+            # worker อยู่จน deleteLater (หลัง thread จบ) → ไม่ถือ df/hash ที่ส่งเข้ามาไว้นานกว่างาน
+            self.df_a = self.df_b = self.cached_a = self.cached_b = None
+        self.finished.emit(res)
+
+    def _hash_side(self, df: pd.DataFrame, keys: List[str], label: str) -> Tuple[pd.Series, pd.DataFrame]:
+        # ก้อนละ CHUNK_SIZE แถว (ใหญ่พอที่ factorize/sampling ไม่เสียเปล่าต่อก้อน) เพื่อส่ง progress
+        # และจำกัด memory ชั่วคราวของ build_key_hash; เขียนลง array ที่จองไว้ ไม่ต้อง pd.concat ทุกก้อน
+        size = self.CHUNK_SIZE
+        num_chunks = (len(df) + size - 1) // size
+        if num_chunks <= 1 or not any(keys):
+            key_hash = build_key_hash(df, keys)
+            if num_chunks:
+                self.progress.emit(num_chunks, f"แฮช {label} chunk {num_chunks}/{num_chunks}")
+        else:
+            out = np.empty(len(df), dtype=np.uint64)
+            for i, start in enumerate(range(0, len(df), size)):
+                self._check_cancel()
+                out[start:start + size] = build_key_hash(df.iloc[start:start + size], keys).to_numpy()
+                self.progress.emit(1, f"แฮช {label} chunk {i + 1}/{num_chunks}")
+            key_hash = pd.Series(out, index=df.index, copy=False)
+        self._check_cancel()
+        return key_hash, hash_to_keyrows(df, keys, key_hash)
+
+    def _run(self) -> Dict:
+        df_a, df_b, keys_a, keys_b = self.df_a, self.df_b, self.keys_a, self.keys_b
+        # --- coverage / duplicates (chunked hashing) ---
+        # df/keys เดิม (เช่นแค่ปรับ tolerance แล้วกด compare ซ้ำ) → ได้จาก cache บน FileBlock ไม่ต้อง hash ใหม่
+        # ต้อง hash ทั้งสองฝั่ง → hash B ใน thread pool ระหว่าง hash A บน thread นี้
+        # (factorize / hash_array บนคีย์ตัวเลขหรือ Arrow และ fold ของ numba ปล่อย GIL; progress signal ส่งข้าม thread ได้)
+        with ThreadPoolExecutor(max_workers=1) as ex:
+            fut_b = None
+            if self.cached_a is None and self.cached_b is None and (os.cpu_count() or 1) > 1:
+                fut_b = ex.submit(self._hash_side, df_b, keys_b, "B")
+            a_key, keyrows_a = self.cached_a or self._hash_side(df_a, keys_a, "A")
+            b_key, keyrows_b = self.cached_b or (fut_b.result() if fut_b else self._hash_side(df_b, keys_b, "B"))
+        res = {"hash_a": (a_key, keyrows_a), "hash_b": (b_key, keyrows_b)}
+        self._check_cancel()
+
+        res["dup_a"] = _dup_df(a_key, "ไฟล์ 1")
+        res["dup_b"] = _dup_df(b_key, "ไฟล์ 2")
+        self.progress.emit(1, "คำนวณคีย์ซ้ำแล้ว")
+        self._check_cancel()
+
+        # keyrows["h"] = hash ไม่ซ้ำ (ไม่มี NA) อยู่แล้ว → จับคู่ uint64 ตรง ๆ ครั้งเดียวได้ mask ทั้งสองฝั่ง
+        # ตามลำดับแถวใน keyrows เลย → หยิบตาราง only/both ด้วย mask ไม่ต้องค้นคีย์ซ้ำ
+        a_arr = keyrows_a["h"].to_numpy(dtype=np.uint64)
+        b_arr = keyrows_b["h"].to_numpy(dtype=np.uint64)
+        a_in_b, b_in_a = _match_unique_u64(a_arr, b_arr)
+        # ใช้แค่จำนวน → นับจาก mask ไม่ต้องสร้าง array only/both
+        both_pos = np.flatnonzero(a_in_b)
+        n_only_a = len(a_arr) - len(both_pos)
+        n_only_b = len(b_arr) - int(np.count_nonzero(b_in_a))
+
+        SAMPLE = self.SAMPLE
+        res["only_a"] = keyrows_take("onlyA", keyrows_a, ~a_in_b, [k for k in keys_a if k])
+        res["only_b"] = keyrows_take("onlyB", keyrows_b, ~b_in_a, [k for k in keys_b if k])
+        # คีย์ที่ตรงกันทุกตัวอยู่ใน keyrows_a อยู่แล้ว → ตัวอย่าง SAMPLE แถวแรกตามลำดับไฟล์ A
+        res["both"] = keyrows_take("both", keyrows_a, both_pos[:SAMPLE], [k for k in keys_a if k])
+
+        # update progress after building basic tables
+        self.progress.emit(1, "สร้างตารางครอบคลุมแล้ว")
+        self._check_cancel()
+
+        inter = len(both_pos)
+        total_a = inter + n_only_a
+        total_b = inter + n_only_b
+        union = len(a_arr) + len(b_arr) - inter
+        jacc = (inter / union) if union else 0.0
+        
+        # Determine status
+        if n_only_a == 0 and n_only_b == 0:
+            status = "✅ ตรงกันทั้งหมด (MATCHED)"
+            cls = "ok"
+        elif inter > 0:
+            status = "⚠️ ตรงกันบางส่วน (PARTIAL MATCH)"
+            cls = "partial"
+        else:
+            status = "❌ ไม่ตรงกัน (NO MATCH)"
+            cls = "none"
+        
+        key_list_a = ", ".join(keys_a) or "ไม่มี"
+        key_list_b = ", ".join(keys_b) or "ไม่มี"
+
+        html = _SUMMARY_HTML_TEMPLATE.format(
+            status=status, cls=cls,
+            pct_a=(inter / total_a * 100 if total_a else 0), total_a=total_a,
+            pct_b=(inter / total_b * 100 if total_b else 0), total_b=total_b,
+            jacc=jacc * 100, inter=inter, union=union,
+            key_list_a=key_list_a, key_list_b=key_list_b, sample=SAMPLE,
+        )
+        res["summary_html"] = html
+        # mask/ตำแหน่งขนาดเท่าจำนวนคีย์ไม่ซ้ำ ใช้เสร็จแล้ว → คืน memory ก่อนเทียบค่า (ช่วงที่ใช้ memory สูงสุด)
+        del a_arr, b_arr, a_in_b, b_in_a, both_pos
+
+        # --- value difference (NEW) ---
+        res["valdiff"] = None
+        if self._map_pairs:
+            # reserve remaining steps to value-diff comparisons
+            self.progress.emit(1, "เริ่มเปรียบเทียบค่า")
+            res["valdiff"] = self._compute_value_diff(df_a, df_b, keys_a, keys_b, a_key, b_key)
+        return res
 
-    # ------------- progress helpers (Thai messages) -------------
-    def _start_progress(self, task: str, total_steps: int = 100):
-        """Start a simple percent progress in the status bar.
 
-        Shows messages like: "กำลังทำงาน: <task> 12%" and records start time.
+    def _compute_value_diff(self, df_a: pd.DataFrame, df_b: pd.DataFrame,
+                            keys_a: List[str], keys_b: List[str],
+                            a_key: pd.Series, b_key: pd.Series) -> pd.DataFrame:
         """
-        try:
-            self._prog_task = task
-            self._prog_total = max(1, int(total_steps))
-            self._prog_step = 0
-            self._prog_t0 = time.time()
-            self._status.showMessage(f"กำลังทำงาน: {task} 0%")
-            QtWidgets.QApplication.processEvents()
-        except Exception:
-            # don't let progress helpers break the main flow
-            pass
+        จับคู่แถว A/B ด้วย key hash (คีย์คนละชื่อ/คนละ dtype ได้) แล้วเทียบคู่ mapping ที่กำหนด
+        คืนเฉพาะแถวที่ 'ไม่ผ่าน' เกณฑ์ tolerance (สำหรับ Numeric) หรือไม่เท่ากัน (Text)
+        """
+        on_keys = [k for k in keys_a if k]
+        # ใช้ hash ที่คำนวณไว้แล้วแทน pd.merge: B คีย์ไม่ซ้ำ → get_indexer (map) ครั้งเดียว
+        # ไม่ต้อง rename คีย์ / ไม่มี suffix _A/_B ชนกัน / ไม่ลากคอลัมน์อื่นเข้ามา
+        ha = _hash_u64(a_key)
+        hb = _hash_u64(b_key)
+        b_index = pd.Index(hb)
+        if b_index.is_unique:
+            pos = b_index.get_indexer(ha)
+            ia = np.flatnonzero(pos >= 0)
+            ib = pos[ia]
+            del pos
+        else:
+            # คีย์ซ้ำฝั่ง B → ทุกคู่ A×B ของคีย์เดียวกัน (เหมือน inner merge เดิม – ตั้งใจให้เห็นทุกคู่)
+            pairs = pd.DataFrame({"h": ha, "ia": np.arange(len(ha))}).merge(
+                pd.DataFrame({"h": hb, "ib": np.arange(len(hb))}), on="h", sort=False)
+            ia = pairs["ia"].to_numpy()
+            ib = pairs["ib"].to_numpy()
+            del pairs
+        # hash table ของ b_index (engine สร้างตอน is_unique/get_indexer) ไม่ใช้อีก → ทิ้งก่อน take คอลัมน์ของแต่ละคู่
+        del ha, hb, b_index
+        self._check_cancel()
+        key_vals = {k: df_a[k].array.take(ia) for k in on_keys}
 
-    def _update_progress(self, step_inc: int = 1, note: str = ""):
-        """Increment progress by step_inc and update status message.
+        rows = []
+        # progress: update per mapping pair when available
+        total_maps = len(self._map_pairs) if self._map_pairs else 0
+        map_idx = 0
+        out_cols = on_keys + ["mapped_column", "A_value", "B_value", "diff", "rule"]
+
+        # ข้ามคู่ที่หาไม่เจอ; ดึง Series ของแต่ละคู่บน thread นี้ก่อน → งานใน pool อ่านอย่างเดียว ไม่แตะ df
+        pairs = [(a_col, b_col, typ) for a_col, b_col, typ in self._map_pairs
+                 if a_col in df_a.columns and b_col in df_b.columns]
+        # แต่ละคู่ไม่ขึ้นต่อกัน และ kernel หนัก ๆ (take/ลบ/เทียบ/Arrow strip) ปล่อย GIL → กระจายลง thread pool
+        # เก็บผลตามลำดับคู่เดิม (ไม่ใช่ as_completed) ให้ลำดับแถวใน valdiff คงที่
+        workers = max(1, min(len(pairs), os.cpu_count() or 1))
+        with ThreadPoolExecutor(max_workers=workers) as ex:
+            futures = [ex.submit(self._diff_pair, df_a[a_col], df_b[b_col], f"{a_col} ↔ {b_col}", typ,
+                                 ia, ib, key_vals, out_cols)
+                       for a_col, b_col, typ in pairs]
+            for (a_col, b_col, _), fut in zip(pairs, futures):
+                if self._cancel:
+                    # คู่ที่ยังไม่เริ่มไม่ต้องรัน; with รอแค่คู่ที่กำลังรันอยู่
+                    for f in futures:
+                        f.cancel()
+                    raise _CompareCancelled()
+                rows.extend(fut.result())
+                # progress หนึ่ง step ต่อคู่ (note like "colA↔colB")
+                map_idx += 1
+                self.progress.emit(1, f"{a_col}↔{b_col}")
 
-        note is optional extra text appended to message.
+        # คู่ที่ข้ามไป (หาคอลัมน์ไม่เจอ) → เติม step ที่จองไว้ให้ครบ
+        remaining = max(0, total_maps - map_idx)
+        if remaining:
+            self.progress.emit(remaining, "")
+        if not rows:
+            return pd.DataFrame(columns=out_cols)
+        return _concat_columns(rows, out_cols)
+
+    def _diff_pair(self, s_a: pd.Series, s_b: pd.Series, label: str, typ: str,
+                   ia: np.ndarray, ib: np.ndarray, key_vals: Dict[str, object],
+                   out_cols: List[str]) -> List[Dict[str, object]]:
+        """เทียบ mapping หนึ่งคู่บนแถวที่จับคู่แล้ว (ia/ib) → คอลัมน์ (dict ตาม out_cols) ของแถวที่ไม่ผ่าน
+
+        อ่านอย่างเดียว (ไม่ emit signal / ไม่แก้ self) จึงรันหลายคู่พร้อมกันใน thread pool ได้
         """
-        try:
-            if not self._prog_task:
-                return
-            self._prog_step = min(self._prog_total, self._prog_step + int(step_inc))
-            pct = (self._prog_step / self._prog_total) * 100
-            note_text = f" • {note}" if note else ""
-            self._status.showMessage(f"กำลังทำงาน: {self._prog_task} {pct:.0f}%{note_text}")
-            QtWidgets.QApplication.processEvents()
-        except Exception:
-            pass
+        col_a = s_a.take(ia).reset_index(drop=True)
+        col_b = s_b.take(ib).reset_index(drop=True)
+        frames = []
+
+        def emit(pos: np.ndarray, a_vals, b_vals, diff, rule: str):
+            # เก็บเป็น dict ของ array ต่อคอลัมน์ (ยังไม่สร้าง DataFrame) → _concat_columns ต่อทีละคอลัมน์ภายหลัง
+            # pos = ตำแหน่งแถวที่ไม่ผ่าน (take ตรง ๆ ไม่ต้องมี bool mask ยาวเท่าทั้งคอลัมน์)
+            # a_vals/b_vals/diff = ค่าเฉพาะแถวเหล่านั้นแล้ว (ตามลำดับแถว)
+            n = len(pos)
+            out = {k: v.take(pos) for k, v in key_vals.items()}
+            out["mapped_column"] = np.full(n, label, dtype=object)
+            out["A_value"] = a_vals
+            out["B_value"] = b_vals
+            out["diff"] = np.full(n, diff, dtype=object) if isinstance(diff, str) else diff
+            out["rule"] = np.full(n, rule, dtype=object)
+            frames.append(out)
+
+        if typ == "Numeric":
+            # safe_numeric คืน int64/float64 ของ numpy เสมอ → ลบ/เทียบบน ndarray ตรง ๆ (ไม่ผ่าน dispatch/index ของ Series)
+            va = safe_numeric(col_a).to_numpy()
+            vb = safe_numeric(col_b).to_numpy()
+            diffv = va - vb
+            # abs หรือ pct ของ max(|A|,|B|) (np.maximum แทน combine(max) ทีละค่า); ทั้งคู่ 0 → ผ่าน
+            pos = np.flatnonzero(~_numeric_ok(va, vb, self._abs_tol, self._pct_tol, diff=diffv))
+            if len(pos):
+                rule_str = f"abs≤{self._abs_tol} or pct≤{self._pct_tol*100:.2f}%"
+                emit(pos, col_a.array.take(pos), col_b.array.take(pos), diffv[pos], rule_str)
+        else:
+            # Text compare: เท่ากันแบบตรงตัว (trim)
+            cand = _text_candidates(col_a, col_b)
+            if cand is None:
+                sa = _strip_text(col_a)
+                sb = _strip_text(col_b)
+                pos = np.flatnonzero(_text_ne(sa, sb))
+                if len(pos):
+                    emit(pos, sa.array.take(pos), sb.array.take(pos), "", "text_equal")
+            elif len(cand):
+                # trim/เทียบเฉพาะแถวที่ค่าดิบต่างกัน (ส่วนใหญ่ค่าตรงกันอยู่แล้ว)
+                sa = _strip_text(col_a.iloc[cand])
+                sb = _strip_text(col_b.iloc[cand])
+                ne = np.flatnonzero(_text_ne(sa, sb))
+                if len(ne):
+                    emit(cand[ne], sa.array.take(ne), sb.array.take(ne), "", "text_equal")
+        return frames
 
-    def _finish_progress(self, done_text: str = "เสร็จแล้ว"):
-        """Finish progress and show elapsed time in status bar."""
+
+# =============================
+# Export helpers
+# =============================
+_XLSX_MAX_ROWS = 1_048_576
+_XLSX_CHUNK = 50_000
+
+
+def _write_xlsx(path: str, sheets: Dict[str, pd.DataFrame]):
+    """เขียนหลาย sheet ลง .xlsx; มี xlsxwriter → เขียนทีละแถวแบบ constant_memory (flush ทีละแถว RSS คงที่)
+
+    df.to_excel เขียนทีละคอลัมน์ จึงใช้ constant_memory ไม่ได้ (ข้อมูลหาย) และช้ากว่าเพราะจัด style ทุก cell
+    ไม่มี xlsxwriter → pd.ExcelWriter ตามเดิม
+    """
+    if xlsxwriter is None:
+        with pd.ExcelWriter(path) as xw:
+            for name, df in sheets.items():
+                df.to_excel(xw, index=False, sheet_name=name)
+        return
+    for name, df in sheets.items():
+        if len(df) + 1 > _XLSX_MAX_ROWS:
+            raise ValueError(f"sheet '{name}' มี {len(df):,} แถว เกินที่ Excel รองรับ ({_XLSX_MAX_ROWS - 1:,}) – ส่งออกเป็น CSV แทน")
+    wb = xlsxwriter.Workbook(path, {
+        "constant_memory": True,
+        "nan_inf_to_errors": True,
+        "strings_to_formulas": False,
+        "strings_to_urls": False,
+        "default_date_format": "yyyy-mm-dd hh:mm:ss",
+    })
+    try:
+        bold = wb.add_format({"bold": True})
+        for name, df in sheets.items():
+            ws = wb.add_worksheet(name)
+            ws.write_row(0, 0, [str(c) for c in df.columns], bold)
+            write_row = ws.write_row
+            r = 1
+            # แปลงเป็น Python object (NA → None = cell ว่าง) ทีละ chunk ไม่ต้องมีสำเนา object ทั้ง df
+            for start in range(0, len(df), _XLSX_CHUNK):
+                part = df.iloc[start:start + _XLSX_CHUNK].astype(object)
+                part = part.where(part.notna(), None)
+                for row in part.itertuples(index=False, name=None):
+                    write_row(r, 0, row)
+                    r += 1
+    finally:
+        wb.close()
+
+
+def _is_csv_path(path: str) -> bool:
+    return str(path).lower().endswith((".csv", ".csv.gz"))
+
+
+def _drop_page_cache(path: str):
+    """บอก kernel ว่าไม่ต้องเก็บไฟล์ export ไว้ใน page cache (ไฟล์ใหญ่ไม่ไล่หน่วยความจำของโปรแกรมออก)
+
+    best-effort: มีเฉพาะบน POSIX และหน้าที่ยังไม่ได้เขียนลงดิสก์ kernel จะข้ามไป
+    """
+    if not hasattr(os, "posix_fadvise"):
+        return
+    try:
+        fd = os.open(path, os.O_RDONLY)
         try:
-            dt = time.time() - (self._prog_t0 or time.time())
-            self._status.showMessage(f"{done_text} ({dt:.2f}s)")
-            QtWidgets.QApplication.processEvents()
-            # reset
-            self._prog_task = None
-            self._prog_total = 0
-            self._prog_step = 0
-            self._prog_t0 = 0.0
-        except Exception:
-            pass
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+    except OSError:
+        pass
 
-    # ------------- pages -------------
-    def _build_page_setup(self):
-        self.page_setup = QtWidgets.QWidget()
-        vmain = QtWidgets.QVBoxLayout(self.page_setup)
-        vmain.setContentsMargins(16, 16, 16, 16)
-        vmain.setSpacing(12)
 
-        # top toolbar
-        top = QtWidgets.QHBoxLayout()
+def _arrow_part(df: pd.DataFrame, section: Optional[str], cache: Optional[Dict] = None):
+    """df → Arrow Table (+ คอลัมน์ section) หรือ None ถ้าแปลงไม่ได้
+
+    cache: {id(df): (df, table|None)} – ผลลัพธ์ชุดเดิมแปลงครั้งเดียว export ซ้ำ (csv/csv.gz/ไฟล์ใหม่) ไม่ต้อง from_pandas อีก
+    section ต่อเป็นคอลัมน์ Arrow ท้ายตาราง (ไม่ copy ทั้ง df แบบ df.assign)
+    """
+    hit = cache.get(id(df)) if cache is not None else None
+    if hit is not None and hit[0] is df:
+        table = hit[1]
+    else:
+        try:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+            table = None
+        if cache is not None:
+            cache[id(df)] = (df, table)
+    if table is None or section is None:
+        return table
+    return table.append_column("section", pa.repeat(section, table.num_rows))
+
+
+def _csv_text_table(df: pd.DataFrame, table):
+    """แปลงคอลัมน์ที่ writer ของ Arrow เขียนต่างจาก df.to_csv ให้เป็นข้อความแบบ pandas (ไฟล์เหมือนกันทั้งสองทาง)
+
+    วันที่/เวลา (Arrow เติม .000000 และ +0700) และ object ที่ไม่ใช่ข้อความ → str แบบ pandas ทีละคอลัมน์
+    bool → True/False ; float ที่เป็นจำนวนเต็ม → ต่อ .0 (Arrow เขียน 1 แทน 1.0) ; ค่าว่างยังเป็นช่องว่าง
+    table = ผลของ _arrow_part(df, …) (คอลัมน์ตามลำดับ df ; section ต่อท้ายไม่ถูกแตะ)
+    """
+    for i in range(df.shape[1]):
+        col = table.column(i)
+        typ = col.type
+        s = df.iloc[:, i]
+        if pa.types.is_temporal(typ) or (s.dtype == object and not (pa.types.is_string(typ)
+                                                                     or pa.types.is_large_string(typ))):
+            arr = pa.array(s.astype(str).where(s.notna()), type=pa.string(), from_pandas=True)
+        elif pa.types.is_boolean(typ):
+            arr = pc.if_else(col, "True", "False")
+        elif pa.types.is_floating(typ):
+            txt = pc.cast(col, pa.string())
+            arr = pc.if_else(pc.match_substring_regex(txt, r"^-?\d+$"),
+                             pc.binary_join_element_wise(txt, ".0", ""), txt)
+        else:
+            continue
+        table = table.set_column(i, table.field(i).name, arr)
+    return table
+
+
+def _write_csv(path: str, parts: List[Tuple[pd.DataFrame, Optional[str]]], cache: Optional[Dict] = None):
+    """ต่อหลายส่วน [(df, ค่าคอลัมน์ section หรือ None)] (คอลัมน์ไม่ต้องตรงกัน – ที่ไม่มีเป็นค่าว่าง) แล้วเขียน CSV utf-8
+
+    มี pyarrow → concat_tables (ไม่ copy) + writer ของ Arrow (C++ หลาย thread) และคีย์ uint64 ไม่กลายเป็น float
+    ข้อความในไฟล์เหมือนทาง pandas (_csv_text_table) ยกเว้น Arrow ใส่ "" รอบหัวตารางและค่าข้อความทุกช่อง
+    คอลัมน์ object ที่ปนหลายชนิด (เช่น A_value ของ valdiff) แปลงเป็น Arrow ไม่ได้ → เขียนด้วย pandas ทีละส่วนต่อท้ายไฟล์
+    path ลงท้าย .csv.gz → บีบอัด gzip ระหว่างเขียน (compresslevel=1: เร็ว ไฟล์เล็กลงมากสำหรับข้อความซ้ำ ๆ)
+    """
+    gz = str(path).lower().endswith(".gz")
+    if pa is not None:
+        tables = [_arrow_part(df, section, cache) for df, section in parts]
+        if all(t is not None for t in tables):
+            tables = [_csv_text_table(df, t) for (df, _), t in zip(parts, tables)]
+            table = pa.concat_tables(tables, promote_options="default")
+            if gz:
+                with gzip.open(path, "wb", compresslevel=1) as fh:
+                    pacsv.write_csv(table, fh)
+            else:
+                pacsv.write_csv(table, path)
+            _drop_page_cache(path)
+            return
+    # หัวตาราง = union ของคอลัมน์ทุกส่วน; เขียนทีละส่วนลง handle เดียว (ไม่มี frame รวม)
+    # reindex ได้สำเนาอยู่แล้ว → ใส่ section ลงสำเนานั้นเลย ไม่ต้อง df.assign อีกรอบ
+    cols = list(dict.fromkeys(c for df, section in parts
+                              for c in [*df.columns, *(["section"] if section is not None else [])]))
+    if gz:
+        fh = gzip.open(path, "wt", compresslevel=1, encoding="utf-8", newline="")
+    else:
+        fh = open(path, "w", encoding="utf-8", newline="")
+    with fh:
+        for i, (df, section) in enumerate(parts):
+            out = df.reindex(columns=cols)
+            if section is not None:
+                out["section"] = section
+            out.to_csv(fh, index=False, header=(i == 0))
+            del out
+    _drop_page_cache(path)
+
+
+_EXPORT_FILTER = "Excel (*.xlsx);;CSV (*.csv);;CSV gzip (*.csv.gz)"
+if pa is not None:
+    _EXPORT_FILTER += ";;Arrow IPC (*.arrow)" + (";;Parquet (*.parquet)" if pq is not None else "")
+
+
+def _is_arrow_path(path: str) -> bool:
+    return str(path).lower().endswith((".arrow", ".parquet"))
+
+
+def _stringify_mixed(df: pd.DataFrame) -> pd.DataFrame:
+    """คอลัมน์ object ที่ Arrow แปลงไม่ได้ (ปน str กับตัวเลข เช่น A_value ของ valdiff) → text, NA คงเป็น NA"""
+    out = df.copy(deep=False)
+    for c in out.columns:
+        col = out[c]
+        if col.dtype != object:
+            continue
+        try:
+            pa.array(col, from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            out[c] = col.astype(str).where(col.notna(), None)
+    return out
+
+
+def _write_arrow(path: str, parts: List[Tuple[pd.DataFrame, Optional[str]]], cache: Optional[Dict] = None):
+    """ต่อหลายส่วนแบบ _write_csv แล้วเขียน Arrow IPC (.arrow) หรือ Parquet (zstd) – เก็บ dtype ไว้ โหลดกลับเข้า pandas ได้ตรง ๆ"""
+    if pa is None:
+        raise ValueError("ส่งออก .arrow / .parquet ต้องติดตั้ง pyarrow")
+    parquet = str(path).lower().endswith(".parquet")
+    if parquet and pq is None:
+        raise ValueError("ส่งออก .parquet ต้องมี pyarrow.parquet")
+    tables = []
+    for df, section in parts:
+        t = _arrow_part(df, section, cache)
+        if t is None:
+            t = _arrow_part(_stringify_mixed(df), section)
+        tables.append(t)
+    table = pa.concat_tables(tables, promote_options="default")
+    if parquet:
+        pq.write_table(table, path, compression="zstd", compression_level=1)
+    else:
+        with pa.ipc.new_file(path, table.schema) as writer:
+            writer.write_table(table)
+
+
+class ExportWorker(QtCore.QObject):
+    """เขียนไฟล์ export (.xlsx / .csv / .csv.gz / .arrow / .parquet) บน QThread แยก – UI ไม่ค้างระหว่างเขียนไฟล์ใหญ่
+
+    sections = [(ชื่อ sheet, ค่าคอลัมน์ section ใน CSV หรือ None, df)]; arrow_cache ดู _arrow_part
+    progress(step_inc, note) → status bar; finished(path) / failed(str)
+    """
+    progress = QtCore.pyqtSignal(int, str)
+    finished = QtCore.pyqtSignal(str)
+    failed = QtCore.pyqtSignal(str)
+
+    def __init__(self, path: str, sections: List[Tuple[str, Optional[str], pd.DataFrame]],
+                 arrow_cache: Optional[Dict] = None):
+        super().__init__()
+        self.path = path
+        self.sections = list(sections)
+        self.arrow_cache = arrow_cache
+
+    @QtCore.pyqtSlot()
+    def run(self):
+        try:
+            if _is_arrow_path(self.path):
+                self.progress.emit(1, "เตรียมข้อมูลแล้ว")
+                _write_arrow(self.path, [(df, section) for _, section, df in self.sections], self.arrow_cache)
+            elif _is_csv_path(self.path):
+                self.progress.emit(1, "เตรียมข้อมูลแล้ว")
+                _write_csv(self.path, [(df, section) for _, section, df in self.sections], self.arrow_cache)
+            else:
+                sheets = {name: df for name, _, df in self.sections}
+                self.progress.emit(1, "เตรียมข้อมูลแล้ว")
+                _write_xlsx(self.path, sheets)
+        except Exception as e:
+            self.failed.emit(str(e))
+            return
+        self.finished.emit(self.path)
+
+
+# HTML report (ส่งออก .html): CSS และโครงหน้าเป็นค่าคงที่ – ตอนสร้าง report แค่ .format ส่วน body ครั้งเดียว
+_REPORT_HEAD = """<!DOCTYPE html>
+<html lang="th">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>เปรียบเทียบข้อมูล – Summary Report</title>
+    <style>
+"""
+
+_REPORT_CSS = """        * { font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; }
+        body {
+            margin: 0;
+            padding: 20px;
+            background: #f5f5f5;
+        }
+        .container {
+            max-width: 1200px;
+            margin: 0 auto;
+            background: white;
+            border-radius: 8px;
+            padding: 30px;
+            box-shadow: 0 2px 4px rgba(0,0,0,0.1);
+        }
+        .header {
+            text-align: center;
+            border-bottom: 3px solid #0066cc;
+            padding-bottom: 20px;
+            margin-bottom: 30px;
+        }
+        .header h1 {
+            margin: 0;
+            color: #0066cc;
+            font-size: 28px;
+        }
+        .header .timestamp {
+            color: #666;
+            margin-top: 10px;
+            font-size: 14px;
+        }
+        .status-card {
+            color: white;
+            padding: 20px;
+            border-radius: 8px;
+            margin-bottom: 30px;
+            text-align: center;
+            font-size: 18px;
+            font-weight: bold;
+        }
+        .grid {
+            display: grid;
+            grid-template-columns: 1fr 1fr;
+            gap: 20px;
+            margin-bottom: 30px;
+        }
+        .card {
+            background: #f9fafb;
+            border: 1px solid #e5e7eb;
+            border-radius: 8px;
+            padding: 20px;
+        }
+        .card h2 {
+            margin-top: 0;
+            color: #1f2937;
+            font-size: 16px;
+            border-bottom: 2px solid #0066cc;
+            padding-bottom: 10px;
+        }
+        .metric {
+            display: flex;
+            justify-content: space-between;
+            padding: 8px 0;
+            border-bottom: 1px solid #e5e7eb;
+        }
+        .metric:last-child {
+            border-bottom: none;
+        }
+        .metric-label {
+            color: #666;
+            font-weight: 500;
+        }
+        .metric-value {
+            color: #0066cc;
+            font-weight: bold;
+            font-size: 14px;
+        }
+        .metric-percent {
+            color: #059669;
+            font-weight: bold;
+        }
+        .section {
+            margin-top: 30px;
+            border-top: 2px solid #e5e7eb;
+            padding-top: 20px;
+        }
+        .section h3 {
+            color: #1f2937;
+            margin-top: 0;
+            border-bottom: 2px solid #0066cc;
+            padding-bottom: 10px;
+        }
+        .detail {
+            background: #f0f9ff;
+            padding: 12px;
+            border-left: 4px solid #0066cc;
+            margin: 10px 0;
+            border-radius: 4px;
+        }
+        table {
+            width: 100%;
+            border-collapse: collapse;
+            margin-top: 10px;
+            font-size: 13px;
+        }
+        th {
+            background: #0066cc;
+            color: white;
+            padding: 10px;
+            text-align: left;
+            font-weight: bold;
+        }
+        td {
+            padding: 8px 10px;
+            border-bottom: 1px solid #e5e7eb;
+        }
+        tr:nth-child(even) {
+            background: #f9fafb;
+        }
+        .footer {
+            margin-top: 40px;
+            padding-top: 20px;
+            border-top: 2px solid #e5e7eb;
+            color: #666;
+            font-size: 12px;
+            text-align: center;
+        }
+        .signature {
+            display: grid;
+            grid-template-columns: 1fr 1fr 1fr;
+            gap: 30px;
+            margin-top: 30px;
+            text-align: center;
+        }
+        .sig-line {
+            height: 1px;
+            background: #000;
+            margin: 5px 0;
+        }
+        .warning {
+            background: #fff7ed;
+            border-left: 4px solid #ea580c;
+            padding: 12px;
+            margin: 10px 0;
+            border-radius: 4px;
+        }
+        .success {
+            background: #f0fdf4;
+            border-left: 4px solid #16a34a;
+            padding: 12px;
+            margin: 10px 0;
+            border-radius: 4px;
+        }
+"""
+
+# ส่วนหัว + CSS ไม่มีค่าที่เปลี่ยน → ต่อเป็น string เดียวตอน import
+_REPORT_PREFIX = _REPORT_HEAD + _REPORT_CSS
+
+# {recommendations} = กล่องข้อเสนอแนะที่ต่อไว้แล้ว
+_REPORT_BODY_TEMPLATE = """    </style>
+</head>
+<body>
+    <div class="container">
+        <div class="header">
+            <h1>📊 Reconciliation Comparison Report</h1>
+            <div class="timestamp">{timestamp}</div>
+        </div>
+        
+        <div class="status-card" style="background: {status_color};">{status}</div>
+        
+        <div class="grid">
+            <div class="card">
+                <h2>📄 File 1 (A)</h2>
+                <div class="metric">
+                    <span class="metric-label">ชื่อไฟล์:</span>
+                    <span>{file_a_name}</span>
+                </div>
+                <div class="metric">
+                    <span class="metric-label">จำนวนแถว:</span>
+                    <span class="metric-value">{total_keys_a:,}</span>
+                </div>
+                <div class="metric">
+                    <span class="metric-label">ตรงกัน:</span>
+                    <span class="metric-value">{both_count:,} <span class="metric-percent">({cov_a:.1f}%)</span></span>
+                </div>
+                <div class="metric">
+                    <span class="metric-label">เฉพาะไฟล์นี้:</span>
+                    <span class="metric-value">{only_a_count:,}</span>
+                </div>
+                <div class="metric">
+                    <span class="metric-label">คีย์ซ้ำ:</span>
+                    <span class="metric-value">{dup_a_count:,}</span>
+                </div>
+                <div class="detail">
+                    <strong>คีย์:</strong> {key_text_a}
+                </div>
+            </div>
+            
+            <div class="card">
+                <h2>📄 File 2 (B)</h2>
+                <div class="metric">
+                    <span class="metric-label">ชื่อไฟล์:</span>
+                    <span>{file_b_name}</span>
+                </div>
+                <div class="metric">
+                    <span class="metric-label">จำนวนแถว:</span>
+                    <span class="metric-value">{total_keys_b:,}</span>
+                </div>
+                <div class="metric">
+                    <span class="metric-label">ตรงกัน:</span>
+                    <span class="metric-value">{both_count:,} <span class="metric-percent">({cov_b:.1f}%)</span></span>
+                </div>
+                <div class="metric">
+                    <span class="metric-label">เฉพาะไฟล์นี้:</span>
+                    <span class="metric-value">{only_b_count:,}</span>
+                </div>
+                <div class="metric">
+                    <span class="metric-label">คีย์ซ้ำ:</span>
+                    <span class="metric-value">{dup_b_count:,}</span>
+                </div>
+                <div class="detail">
+                    <strong>คีย์:</strong> {key_text_b}
+                </div>
+            </div>
+        </div>
+        
+        <div class="section">
+            <h3>📈 สรุปผลการเปรียบเทียบ</h3>
+            <table>
+                <tr>
+                    <th>หมวดหมู่</th>
+                    <th>จำนวน</th>
+                    <th>หมายเหตุ</th>
+                </tr>
+                <tr>
+                    <td>✅ ตรงกัน (ทั้งสองไฟล์)</td>
+                    <td style="color: #16a34a; font-weight: bold;">{both_count:,}</td>
+                    <td>Data integrity OK</td>
+                </tr>
+                <tr>
+                    <td>⚠️ เฉพาะไฟล์ 1 เท่านั้น</td>
+                    <td style="color: #ea580c; font-weight: bold;">{only_a_count:,}</td>
+                    <td>Missing in File B</td>
+                </tr>
+                <tr>
+                    <td>⚠️ เฉพาะไฟล์ 2 เท่านั้น</td>
+                    <td style="color: #ea580c; font-weight: bold;">{only_b_count:,}</td>
+                    <td>Missing in File A</td>
+                </tr>
+                <tr>
+                    <td>❌ ค่าไม่ตรงกัน</td>
+                    <td style="color: #dc2626; font-weight: bold;">{valdiff_count:,}</td>
+                    <td>Value mismatch in mapped columns</td>
+                </tr>
+                <tr>
+                    <td>🔄 คีย์ซ้ำ (A)</td>
+                    <td style="color: #0066cc; font-weight: bold;">{dup_a_count:,}</td>
+                    <td>Duplicate keys in File A</td>
+                </tr>
+                <tr>
+                    <td>🔄 คีย์ซ้ำ (B)</td>
+                    <td style="color: #0066cc; font-weight: bold;">{dup_b_count:,}</td>
+                    <td>Duplicate keys in File B</td>
+                </tr>
+            </table>
+        </div>
+        
+        <div class="section">
+            <h3>✅ ข้อเสนอแนะ</h3>
+{recommendations}
+        </div>
+        
+        <div class="footer">
+            <p>📋 Report generated by Fulfillment Reconcile GUI</p>
+            <p>💡 สำหรับคำถามหรือปัญหา กรุณาติดต่อ Data Team</p>
+        </div>
+    </div>
+</body>
+</html>
+"""
+
+
+# =============================
+# Main Window
+# =============================
+# (thread, worker) ที่ยังรันอยู่ตอนปิดหน้าต่าง – ถือ ref ไว้จน thread จบ (ดู CompareWindow.closeEvent)
+_DETACHED_JOBS: set = set()
+
+
+def _wait_detached_jobs():
+    # ตอนปิดโปรแกรม: compare ถูก cancel แล้ว (จบที่จุดตรวจถัดไป), export ต้องเขียนไฟล์ให้จบ
+    # → รอก่อน interpreter ทำลาย QThread ที่ยังรันอยู่ (= crash)
+    for thread, _ in list(_DETACHED_JOBS):
+        thread.wait()
+
+
+def _detach_job(job: Tuple[QtCore.QThread, QtCore.QObject]):
+    """ถอด thread ออกจากหน้าต่าง (ไม่ถูกทำลายตามหน้าต่าง) แล้วถือ ref ไว้ใน _DETACHED_JOBS จนจบเอง – ไม่รอบน GUI thread"""
+    thread = job[0]
+    thread.setParent(None)
+    if not _DETACHED_JOBS:
+        app = QtWidgets.QApplication.instance()
+        if app is not None:
+            try:
+                app.aboutToQuit.disconnect(_wait_detached_jobs)
+            except TypeError:
+                pass
+            app.aboutToQuit.connect(_wait_detached_jobs)
+    _DETACHED_JOBS.add(job)
+    thread.finished.connect(lambda: _DETACHED_JOBS.discard(job))
+
+
+class CompareWindow(QtWidgets.QMainWindow):
+    requestHome = QtCore.pyqtSignal()
+
+    _FIT_SAMPLE_ROWS = 200
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Compare Files – Reconcile GUI")
+        self.resize(1320, 860)
+
+        # data holders
+        self.df_a: Optional[pd.DataFrame] = None
+        self.df_b: Optional[pd.DataFrame] = None
+        self.df_a_agg: Optional[pd.DataFrame] = None
+        self.df_b_agg: Optional[pd.DataFrame] = None
+
+        # results
+        self._summary_html: str = ""
+        self._only_a_df: Optional[pd.DataFrame] = None
+        self._only_b_df: Optional[pd.DataFrame] = None
+        self._both_df: Optional[pd.DataFrame] = None
+        self._dup_a_df: Optional[pd.DataFrame] = None
+        self._dup_b_df: Optional[pd.DataFrame] = None
+        self._valdiff_df: Optional[pd.DataFrame] = None  # NEW
+
+        # mapping & tolerance (NEW)
+        self._map_pairs: List[Tuple[str,str,str]] = []  # (a_col, b_col, 'Numeric'|'Text')
+        self._abs_tol: float = 0.0
+        self._pct_tol: float = 0.0
+
+        # background compare
+        self._compare_running = False
+        self._compare_jobs: set = set()
+        self._compare_inputs: Optional[Tuple[pd.DataFrame, List[str], pd.DataFrame, List[str]]] = None
+
+        # background export
+        self._export_jobs: set = set()
+        self._export_done_msg: str = ""
+        self._arrow_cache: Dict[int, Tuple[pd.DataFrame, object]] = {}  # ผลลัพธ์ → Arrow Table (ดู _arrow_part)
+
+        # UI
+        self._stack = QtWidgets.QStackedWidget()
+        self.setCentralWidget(self._stack)
+        self._status = self.statusBar()
+        self._status.showMessage("Ready – Load A/B and set keys")
+
+        # progress tracking
+        self._prog_task: Optional[str] = None
+        self._prog_total: int = 0
+        self._prog_step: int = 0
+        self._prog_t0: float = 0.0
+        self._prog_last_flush: float = 0.0
+
+        self._build_page_setup()
+        self._build_page_results()
+        self._stack.setCurrentWidget(self.page_setup)
+
+    # ------------- busy ctx -------------
+    @contextmanager
+    def _busy(self, text: str, done: str = "Done ✅"):
+        QtWidgets.QApplication.setOverrideCursor(QtCore.Qt.WaitCursor)
+        t0 = time.time()
+        self._status.showMessage(f"{text}…")
+        QtWidgets.QApplication.processEvents()
+        try:
+            yield
+        finally:
+            QtWidgets.QApplication.restoreOverrideCursor()
+            dt = time.time() - t0
+            self._status.showMessage(f"{done} ({dt:.2f}s)")
+
+    # ------------- progress helpers (Thai messages) -------------
+    def _flush_ui(self, force: bool = False):
+        """ให้ status bar วาดใหม่ระหว่างงาน sync บน main thread (export/report) ไม่เกิน ~10 ครั้ง/วินาที
+
+        compare / export รันบน QThread และส่ง progress ผ่าน signal อยู่แล้ว → ไม่ต้อง processEvents
+        (และไม่ควร: จะ flush ทั้ง event queue และ reenter slot อื่นระหว่างทาง)
+        """
+        if self._compare_running or self._export_jobs:
+            return
+        now = time.monotonic()
+        if force or now - self._prog_last_flush > 0.1:
+            self._prog_last_flush = now
+            QtWidgets.QApplication.processEvents()
+
+    def _start_progress(self, task: str, total_steps: int = 100):
+        """Start a simple percent progress in the status bar.
+
+        Shows messages like: "กำลังทำงาน: <task> 12%" and records start time.
+        """
+        try:
+            self._prog_task = task
+            self._prog_total = max(1, int(total_steps))
+            self._prog_step = 0
+            self._prog_t0 = time.time()
+            self._status.showMessage(f"กำลังทำงาน: {task} 0%")
+            self._flush_ui(force=True)
+        except Exception:
+            # don't let progress helpers break the main flow
+            pass
+
+    def _update_progress(self, step_inc: int = 1, note: str = ""):
+        """Increment progress by step_inc and update status message.
+
+        note is optional extra text appended to message.
+        """
+        try:
+            if not self._prog_task:
+                return
+            self._prog_step = min(self._prog_total, self._prog_step + int(step_inc))
+            pct = (self._prog_step / self._prog_total) * 100
+            note_text = f" • {note}" if note else ""
+            self._status.showMessage(f"กำลังทำงาน: {self._prog_task} {pct:.0f}%{note_text}")
+            self._flush_ui()
+        except Exception:
+            pass
+
+    def _finish_progress(self, done_text: str = "เสร็จแล้ว"):
+        """Finish progress and show elapsed time in status bar."""
+        try:
+            dt = time.time() - (self._prog_t0 or time.time())
+            self._status.showMessage(f"{done_text} ({dt:.2f}s)")
+            self._flush_ui(force=True)
+            # reset
+            self._prog_task = None
+            self._prog_total = 0
+            self._prog_step = 0
+            self._prog_t0 = 0.0
+        except Exception:
+            pass
+
+    # ------------- pages -------------
+    def _build_page_setup(self):
+        self.page_setup = QtWidgets.QWidget()
+        vmain = QtWidgets.QVBoxLayout(self.page_setup)
+        vmain.setContentsMargins(16, 16, 16, 16)
+        vmain.setSpacing(12)
+
+        # top toolbar
+        top = QtWidgets.QHBoxLayout()
         self.btn_home = QtWidgets.QPushButton("← Home")
         self.btn_clear = QtWidgets.QPushButton("🧼 Clear all")
         self.btn_compare = QtWidgets.QPushButton("⚖️  Compare")
@@ -407,6 +2015,7 @@ class CompareWindow(QtWidgets.QMainWindow):
         self.txt_summary = QtWidgets.QTextBrowser()
         self.txt_summary.setOpenExternalLinks(True)
         self.txt_summary.setMinimumHeight(110)
+        self.txt_summary.document().setDefaultStyleSheet(_SUMMARY_CSS)
         sum_l.addWidget(self.txt_summary)
         v.addWidget(sum_card)
 
@@ -477,9 +2086,13 @@ class CompareWindow(QtWidgets.QMainWindow):
         self._only_a_df = self._only_b_df = self._both_df = None
         self._dup_a_df = self._dup_b_df = None
         self._valdiff_df = None
+        self._arrow_cache.clear()
         self._map_pairs = []
         self._abs_tol = 0.0
         self._pct_tol = 0.0
+        for tv in (self.tbl_only_a, self.tbl_only_b, self.tbl_both,
+                   self.tbl_dup_a, self.tbl_dup_b, self.tbl_valdiff):
+            self._set_table(tv, None, structural=True)
         self._status.showMessage("Cleared")
 
     def _reload_files(self):
@@ -520,6 +2133,9 @@ class CompareWindow(QtWidgets.QMainWindow):
         if dlg.exec_() == QtWidgets.QDialog.Accepted:
             opts = dlg.get_options()
             with self._busy("Aggregating"):
+                # ผล aggregate เดิมจะถูกแทน → ไม่ให้ key hash ใน cache ของ block ถือ df เก่าไว้
+                self.block_a.drop_key_hash(self.df_a_agg)
+                self.block_b.drop_key_hash(self.df_b_agg)
                 try:
                     self.df_a_agg = self._apply_aggregate(df_a, keys_a, opts['a']) if df_a is not None else None
                     self.df_b_agg = self._apply_aggregate(df_b, keys_b, opts['b']) if df_b is not None else None
@@ -577,9 +2193,26 @@ class CompareWindow(QtWidgets.QMainWindow):
             return
         cols_a = list(df_a.columns)
         cols_b = list(df_b.columns)
+        keys_a = [k for k in self.block_a.keys() if k]
+        keys_b = [k for k in self.block_b.keys() if k]
+        # preview เฉพาะเมื่อคีย์ครบทั้งสองฝั่ง (aggregate ตาม Key1 ทำให้ df_a_agg ไม่มีคีย์ที่เหลือ)
+        keys_ok = (keys_a and len(keys_a) == len(keys_b)
+                   and all(k in df_a.columns for k in keys_a) and all(k in df_b.columns for k in keys_b))
+        preview = (df_a, keys_a, df_b, keys_b) if keys_ok else None
+        hash_a = hash_b = None
+        if preview is not None:
+            hit_a = self.block_a.cached_key_hash(df_a, keys_a)
+            hash_a = hit_a[0] if hit_a is not None else None
+            hit_b = self.block_b.cached_key_hash(df_b, keys_b)
+            hash_b = hit_b[0] if hit_b is not None else None
         dlg = MappingDialog(cols_a, cols_b, init_pairs=self._map_pairs,
-                            abs_tol=self._abs_tol, pct_tol=self._pct_tol, parent=self)
-        if dlg.exec_() == QtWidgets.QDialog.Accepted:
+                            abs_tol=self._abs_tol, pct_tol=self._pct_tol, parent=self,
+                            preview_data=preview, preview_hash_a=hash_a, preview_hash_b=hash_b)
+        accepted = dlg.exec_() == QtWidgets.QDialog.Accepted
+        if dlg.preview_built_b is not None:
+            # hash เต็มของ B ที่ preview คำนวณแล้ว → เก็บลง cache ของ FileBlock กด compare ต่อไม่ต้อง hash B ซ้ำ
+            self.block_b.store_key_hash(df_b, keys_b, *dlg.preview_built_b)
+        if accepted:
             res = dlg.result()
             self._map_pairs = res["pairs"]
             self._abs_tol = float(res["abs_tol"])
@@ -588,6 +2221,8 @@ class CompareWindow(QtWidgets.QMainWindow):
 
     # ------------- core compare -------------
     def _on_compare_clicked(self):
+        if self._compare_running:
+            return
         df_a = self.df_a_agg if self.df_a_agg is not None else self.block_a.current_df_or_none()
         df_b = self.df_b_agg if self.df_b_agg is not None else self.block_b.current_df_or_none()
         if df_a is None or df_b is None:
@@ -600,306 +2235,132 @@ class CompareWindow(QtWidgets.QMainWindow):
             QtWidgets.QMessageBox.information(self, "Keys", "โปรดตั้งคีย์ให้ครบ (จำนวนคีย์สองฝั่งต้องเท่ากัน)")
             return
 
-        with self._busy("เปรียบเทียบข้อมูล (ประหยัดหน่วยความจำ)"):
-            # start progress: chunked hashing, set ops, build tables, optional valdiff per mapping
-            chunk_size = 50000
-            num_chunks_a = (len(df_a) + chunk_size - 1) // chunk_size
-            num_chunks_b = (len(df_b) + chunk_size - 1) // chunk_size
-            total_steps = 4 + num_chunks_a + num_chunks_b + (len(self._map_pairs) if self._map_pairs else 0)
-            self._start_progress("เปรียบเทียบ (Chunked)", total_steps=total_steps)
-            
-            # --- coverage / duplicates (chunked hashing) ---
-            # Hash in chunks to avoid memory spike on large files
-            a_key_parts = []
-            for chunk_idx in range(0, len(df_a), chunk_size):
-                chunk = df_a.iloc[chunk_idx:chunk_idx+chunk_size]
-                a_key_parts.append(build_key_hash(chunk, keys_a))
-                self._update_progress(note=f"แฮช A chunk {(chunk_idx // chunk_size) + 1}/{num_chunks_a}")
-                QtWidgets.QApplication.processEvents()
-            a_key = pd.concat(a_key_parts, ignore_index=False)
-            
-            b_key_parts = []
-            for chunk_idx in range(0, len(df_b), chunk_size):
-                chunk = df_b.iloc[chunk_idx:chunk_idx+chunk_size]
-                b_key_parts.append(build_key_hash(chunk, keys_b))
-                self._update_progress(note=f"แฮช B chunk {(chunk_idx // chunk_size) + 1}/{num_chunks_b}")
-                QtWidgets.QApplication.processEvents()
-            b_key = pd.concat(b_key_parts, ignore_index=False)
-
-            def dup_df(s: pd.Series, label: str) -> pd.DataFrame:
-                vc = s.value_counts(dropna=False)
-                vc = vc[vc > 1]
-                if vc.empty:
-                    return pd.DataFrame(columns=["file", "key", "count"])
-                out = vc.rename("count").reset_index().rename(columns={"index": "key"})
-                out.insert(0, "file", label)
-                out["key"] = out["key"].astype("UInt64")
-                return out
-
-            self._dup_a_df = dup_df(a_key, "ไฟล์ 1")
-            self._dup_b_df = dup_df(b_key, "ไฟล์ 2")
-            self._update_progress(note="คำนวณคีย์ซ้ำแล้ว")
-
-            try:
-                a_unique = a_key[~a_key.duplicated(dropna=False)].dropna().astype("uint64")
-                b_unique = b_key[~b_key.duplicated(dropna=False)].dropna().astype("uint64")
-            except TypeError:
-                a_unique = a_key[~a_key.duplicated()].dropna().astype("uint64")
-                b_unique = b_key[~b_key.duplicated()].dropna().astype("uint64")
-
-            a_set = set(a_unique.values.tolist())
-            b_set = set(b_unique.values.tolist())
-            only_a = a_set - b_set
-            only_b = b_set - a_set
-            both = a_set & b_set
-
-            SAMPLE = 5000
-            both_sample = list(both)[:SAMPLE]
-
-            keyrows_a = hash_to_keyrows(df_a, keys_a, a_key)
-            keyrows_b = hash_to_keyrows(df_b, keys_b, b_key)
-            self._only_a_df = df_from_keys_with_keycols("onlyA", only_a, keyrows_a, [k for k in keys_a if k])
-            self._only_b_df = df_from_keys_with_keycols("onlyB", only_b, keyrows_b, [k for k in keys_b if k])
-
-            kr_a = keyrows_a.set_index("h")
-            kr_b = keyrows_b.set_index("h")
-            keyrows_both = pd.concat([kr_a, kr_b.loc[lambda d: ~d.index.isin(kr_a.index)]], axis=0).reset_index()
-            self._both_df = df_from_keys_with_keycols("both", both_sample, keyrows_both, [k for k in keys_a if k] or [k for k in keys_b if k])
-
-            # update progress after building basic tables
-            self._update_progress(step_inc=1, note="สร้างตารางครอบคลุมแล้ว")
-
-            inter = len(both)
-            total_a = inter + len(only_a)
-            total_b = inter + len(only_b)
-            union = len(a_set | b_set)
-            jacc = (inter / union) if union else 0.0
-            
-            # Determine status
-            if len(only_a) == 0 and len(only_b) == 0:
-                status = "✅ ตรงกันทั้งหมด (MATCHED)"
-                color = "#10b981"
-            elif inter > 0:
-                status = "⚠️ ตรงกันบางส่วน (PARTIAL MATCH)"
-                color = "#f59e0b"
-            else:
-                status = "❌ ไม่ตรงกัน (NO MATCH)"
-                color = "#ef4444"
-            
-            key_list_a = ", ".join(keys_a) or "ไม่มี"
-            key_list_b = ", ".join(keys_b) or "ไม่มี"
-
-            html = f"""
-              <div style='font-family:Segoe UI,Roboto,Arial;line-height:1.6;'>
-                <div style='padding:12px 16px;border-radius:10px;background:{color}20;border:2px solid {color};margin-bottom:12px;'>
-                  <div style='font-size:18px;font-weight:700;color:{color};'>{status}</div>
-                  <div style='margin-top:4px;color:#555;font-size:13px;'>หลังจากใช้ตัวกรอง และการรวมข้อมูล (ถ้ามี)</div>
-                </div>
-                
-                <div style='display:grid;grid-template-columns:1fr 1fr 1fr;gap:12px;margin-bottom:12px;'>
-                  <div style='padding:12px;border:1px solid #ddd;border-radius:8px;background:#f9fafb;'>
-                    <div style='font-size:12px;color:#6b7280;font-weight:600;'>ไฟล์ 1 ตรงกับไฟล์ 2</div>
-                    <div style='font-size:28px;font-weight:700;color:{color};margin:8px 0;'>{(inter/total_a*100 if total_a else 0):.1f}%</div>
-                    <div style='font-size:11px;color:#666;'>คีย์เฉพาะ = {total_a:,} แถว</div>
-                  </div>
-                  <div style='padding:12px;border:1px solid #ddd;border-radius:8px;background:#f9fafb;'>
-                    <div style='font-size:12px;color:#6b7280;font-weight:600;'>ไฟล์ 2 ตรงกับไฟล์ 1</div>
-                    <div style='font-size:28px;font-weight:700;color:{color};margin:8px 0;'>{(inter/total_b*100 if total_b else 0):.1f}%</div>
-                    <div style='font-size:11px;color:#666;'>คีย์เฉพาะ = {total_b:,} แถว</div>
-                  </div>
-                  <div style='padding:12px;border:1px solid #ddd;border-radius:8px;background:#f9fafb;'>
-                    <div style='font-size:12px;color:#6b7280;font-weight:600;'>ความคล้ายคลึง (Jaccard)</div>
-                    <div style='font-size:28px;font-weight:700;color:{color};margin:8px 0;'>{jacc*100:.1f}%</div>
-                    <div style='font-size:11px;color:#666;'>ตรงกัน {inter:,} / รวม {union:,}</div>
-                  </div>
-                </div>
-                
-                <div style='margin:12px 0;padding:10px;background:#f0f4f8;border-radius:6px;font-size:12px;color:#333;'>
-                  <b>คีย์ที่ใช้:</b><br/>
-                  📄 ไฟล์ 1: <code style='background:#fff;padding:2px 6px;border-radius:3px;'>{key_list_a}</code><br/>
-                  📄 ไฟล์ 2: <code style='background:#fff;padding:2px 6px;border-radius:3px;'>{key_list_b}</code>
-                </div>
-                
-                <div style='margin-top:8px;padding:8px;border-left:3px solid #2563eb;background:#eff6ff;font-size:11px;color:#555;'>
-                  💡 ตัวอย่าง "ตรงกัน" จำกัดที่ {SAMPLE:,} คีย์เพื่อให้เร็ว | ใช้ "ส่งออก" เพื่อดูผลเต็ม
-                </div>
-              </div>
-            """
-            self._summary_html = html
-
-            # --- value difference (NEW) ---
-            self._valdiff_df = None
-            if self._map_pairs:
-                # reserve remaining steps to value-diff comparisons
-                self._update_progress(step_inc=1, note="เริ่มเปรียบเทียบค่า")
-                self._valdiff_df = self._compute_value_diff(df_a, df_b, keys_a, keys_b, both)
-
-            # finish progress for compare
-            self._finish_progress("เปรียบเทียบเสร็จแล้ว ✅")
+        # คำนวณทั้งหมดบน QThread (UI ไม่ค้าง / ไม่ต้อง processEvents ระหว่างทาง); UI อัปเดตผ่าน signal เท่านั้น
+        worker = CompareWorker(df_a, df_b, keys_a, keys_b, self._map_pairs, self._abs_tol, self._pct_tol,
+                               cached_a=self.block_a.cached_key_hash(df_a, keys_a),
+                               cached_b=self.block_b.cached_key_hash(df_b, keys_b))
+        thread = QtCore.QThread(self)
+        worker.moveToThread(thread)
+        thread.started.connect(worker.run)
+        worker.progress.connect(self._update_progress)
+        worker.finished.connect(self._apply_compare_results)
+        worker.failed.connect(self._on_compare_failed)
+        worker.cancelled.connect(self._on_compare_cancelled)
+        worker.finished.connect(thread.quit)
+        worker.failed.connect(thread.quit)
+        worker.cancelled.connect(thread.quit)
+        job = (thread, worker)
+        self._compare_jobs.add(job)  # ถือ ref ไว้จน thread จบจริง
+        thread.finished.connect(lambda: self._compare_jobs.discard(job))
+        thread.finished.connect(worker.deleteLater)
+        thread.finished.connect(thread.deleteLater)
+
+        self._compare_inputs = (df_a, keys_a, df_b, keys_b)
+        self._compare_running = True
+        # clear/reload ระหว่าง compare จะเปลี่ยน df/cache บน FileBlock ที่ worker กำลังใช้อยู่ → ปิดไว้จนจบ
+        for b in (self.btn_compare, self.btn_clear, self.btn_reload):
+            b.setEnabled(False)
+        QtWidgets.QApplication.setOverrideCursor(QtCore.Qt.WaitCursor)
+        self._start_progress("เปรียบเทียบ (Chunked)", total_steps=worker.total_steps())
+        thread.start()
+
+    def _end_compare(self):
+        self._compare_running = False
+        for b in (self.btn_compare, self.btn_clear, self.btn_reload):
+            b.setEnabled(True)
+        QtWidgets.QApplication.restoreOverrideCursor()
+
+    def closeEvent(self, event):
+        # ปิดหน้าต่างระหว่าง compare/export → ไม่รอบน GUI thread: สั่งยกเลิก compare, ตัดสัญญาณที่จะเข้าหน้าต่างนี้
+        # (ผลที่มาช้าต้องไม่ถูกใส่ลงหน้าต่างที่ปิดไปแล้ว) แล้วถอด thread ไปให้จบเอง
+        # (QThread ที่ยังรันอยู่ถูกทำลายพร้อมหน้าต่าง = crash)
+        for job in list(self._compare_jobs):
+            thread, worker = job
+            worker.cancel()
+            worker.progress.disconnect(self._update_progress)
+            worker.finished.disconnect(self._apply_compare_results)
+            worker.failed.disconnect(self._on_compare_failed)
+            worker.cancelled.disconnect(self._on_compare_cancelled)
+            thread.quit()
+            _detach_job(job)
+        for job in list(self._export_jobs):
+            thread, worker = job
+            worker.progress.disconnect(self._update_progress)
+            worker.finished.disconnect(self._on_export_finished)
+            worker.failed.disconnect(self._on_export_failed)
+            thread.quit()
+            _detach_job(job)
+        self._compare_jobs.clear()
+        self._export_jobs.clear()
+        if self._compare_running:
+            self._end_compare()  # คืน override cursor (slot cancelled ถูกตัดไปแล้ว)
+        super().closeEvent(event)
+
+    def _on_compare_cancelled(self):
+        self._end_compare()
+        self._finish_progress("ยกเลิกการเปรียบเทียบแล้ว")
+
+    def _on_compare_failed(self, msg: str):
+        self._end_compare()
+        self._finish_progress("เปรียบเทียบไม่สำเร็จ ❌")
+        QtWidgets.QMessageBox.critical(self, "Compare error", msg)
+
+    def _apply_compare_results(self, res: Dict):
+        df_a, keys_a, df_b, keys_b = self._compare_inputs
+        self._compare_inputs = None
+        self.block_a.store_key_hash(df_a, keys_a, *res["hash_a"])
+        self.block_b.store_key_hash(df_b, keys_b, *res["hash_b"])
+        self._summary_html = res["summary_html"]
+        self._only_a_df = res["only_a"]
+        self._only_b_df = res["only_b"]
+        self._both_df = res["both"]
+        self._dup_a_df = res["dup_a"]
+        self._dup_b_df = res["dup_b"]
+        self._valdiff_df = res["valdiff"]
+        self._arrow_cache.clear()
+
+        # finish progress for compare
+        self._finish_progress("เปรียบเทียบเสร็จแล้ว ✅")
+        self._end_compare()
 
         # push to UI
         self.txt_summary.setHtml(self._summary_html)
         self._set_table(self.tbl_only_a, self._only_a_df)
         self._set_table(self.tbl_only_b, self._only_b_df)
         self._set_table(self.tbl_both, self._both_df)
-        self._set_table(self.tbl_dup_a, self._dup_a_df)
-        self._set_table(self.tbl_dup_b, self._dup_b_df)
-        self._set_table(self.tbl_valdiff, self._valdiff_df)
-
-        self.btn_save_report.setEnabled(True)
-        self.btn_export_cov.setEnabled(True)
-        self.btn_export_mm.setEnabled(True)
-        self.btn_export_val.setEnabled(self._valdiff_df is not None and len(self._valdiff_df) > 0)
-
-        self._stack.setCurrentWidget(self.page_results)
-        more = f" ค่าไม่ตรง:{len(self._valdiff_df):,}" if isinstance(self._valdiff_df, pd.DataFrame) and len(self._valdiff_df) > 0 else ""
-        self._status.showMessage(f"เปรียบเทียบเสร็จ ✅ – เฉพาะไฟล์1:{len(self._only_a_df):,} เฉพาะไฟล์2:{len(self._only_b_df):,} ตรงกัน(ตัวอย่าง):{len(self._both_df):,}{more}")
-
-    def _compute_value_diff(self, df_a: pd.DataFrame, df_b: pd.DataFrame,
-                            keys_a: List[str], keys_b: List[str], both_keys: Iterable[int]) -> pd.DataFrame:
-        """
-        รวม A/B ด้วยคีย์ (คีย์คนละชื่อได้) แล้วเทียบคู่ mapping ที่กำหนด
-        คืนเฉพาะแถวที่ 'ไม่ผ่าน' เกณฑ์ tolerance (สำหรับ Numeric) หรือไม่เท่ากัน (Text)
-        """
-        # เตรียมคีย์: ทำสำเนาพร้อม rename ให้ชื่อคีย์ B ตรงกับฝั่ง A เพื่อ join ง่าย
-        b_ren = df_b.copy()
-        ren_map = {}
-        for a,b in zip(keys_a, keys_b):
-            if a != b:
-                ren_map[b] = a
-        if ren_map:
-            b_ren = b_ren.rename(columns=ren_map)
-
-        # join แบบ inner เฉพาะคีย์ที่ intersect (performance)
-        # เพื่อเลี่ยง exploding บนชุดใหญ่มาก ให้ set index แล้วเลือกเฉพาะ h in both_keys ก็ได้
-        # ตรงนี้เลือกใช้ merge ปกติ (คีย์หลายคอลัมน์)
-        on_keys = [k for k in keys_a if k]
-        merged = pd.merge(df_a, b_ren, how="inner", on=on_keys, suffixes=("_A","_B"))
-
-        # ถ้า both_keys มีให้จำกัดตามจริง (กันกรณีมี key duplicate แล้วเกิน)
-        # สร้าง hash ตามฝั่ง A เพื่อตรวจว่าอยู่ใน both_keys เท่านั้น
-        if on_keys:
-            hk = build_key_hash(merged, on_keys)
-            merged = merged.loc[hk.astype("uint64").isin(list(both_keys))].copy()
-
-        rows = []
-        # progress: update per mapping pair when available
-        total_maps = len(self._map_pairs) if self._map_pairs else 0
-        map_idx = 0
-        # ฟังก์ชันช่วยเช็ค numeric tolerance
-        def pass_numeric(a, b) -> Tuple[bool, float]:
-            a = pd.to_numeric(pd.Series([a]), errors="coerce").iloc[0]
-            b = pd.to_numeric(pd.Series([b]), errors="coerce").iloc[0]
-            if pd.isna(a) and pd.isna(b):
-                return True, 0.0
-            if pd.isna(a) or pd.isna(b):
-                return False, float('nan')
-            diff = float(a) - float(b)
-            if abs(diff) <= self._abs_tol:
-                return True, diff
-            if self._pct_tol > 0:
-                mx = max(abs(float(a)), abs(float(b)))
-                if mx == 0:
-                    # ทั้งคู่เป็นศูนย์แล้วไม่ผ่าน abs_tol → ถือว่าเท่ากัน
-                    return True, diff
-                if abs(diff) <= self._pct_tol * mx:
-                    return True, diff
-            return False, diff
-
-        for a_col, b_col, typ in self._map_pairs:
-            a_name = a_col if a_col in merged.columns else f"{a_col}_A"
-            b_name = b_col
-            # b อาจถูก rename ให้ชื่อเหมือนคีย์ A ไปแล้ว แต่คอลัมน์ mapping ไม่ได้ยุ่ง ให้ดึงจากฝั่ง B
-            # ถ้าโดนชนกับ A ให้พึ่ง suffix "_B"
-            if b_name in on_keys and b_name in merged.columns and f"{b_name}_B" in merged.columns:
-                b_name = f"{b_name}_B"
-            elif b_name in merged.columns and f"{b_name}_B" in merged.columns:
-                # ถ้ามีทั้งสองเวอร์ชัน ให้เลือก _B
-                b_name = f"{b_name}_B"
-
-            if a_name not in merged.columns or b_name not in merged.columns:
-                # ข้ามคู่ที่หาไม่เจอ
-                continue
-
-            sub = merged[on_keys + [a_name, b_name]].copy()
-            if typ == "Numeric":
-                pa, pb = a_name, b_name
-                ok, diff = [], []
-                # vectorize แบบง่าย
-                va = safe_numeric(sub[pa])
-                vb = safe_numeric(sub[pb])
-                mx = va.abs().combine(vb.abs(), max)
-                diffv = (va - vb)
-                cond_abs = diffv.abs() <= self._abs_tol
-                cond_pct = pd.Series([False]*len(sub))
-                if self._pct_tol > 0:
-                    # เลี่ยง divide-by-zero: เมื่อ mx==0 ให้ถือว่า True (0 เท่ากับ 0)
-                    ok_zero = mx == 0
-                    cond_pct = diffv.abs() <= (self._pct_tol * mx)
-                    cond_pct = cond_pct | ok_zero
-                okv = cond_abs | cond_pct
-                mism = sub.loc[~okv].copy()
-                if not mism.empty:
-                    mism["mapped_column"] = f"{a_col} ↔ {b_col}"
-                    mism["A_value"] = sub.loc[mism.index, a_name].values
-                    mism["B_value"] = sub.loc[mism.index, b_name].values
-                    mism["diff"] = diffv.loc[mism.index].values
-                    mism["rule"] = mism.apply(lambda r: f"abs≤{self._abs_tol} or pct≤{self._pct_tol*100:.2f}%", axis=1)
-                    rows.append(mism[on_keys + ["mapped_column","A_value","B_value","diff","rule"]])
-            # progress increment for this mapping
-            try:
-                map_idx += 1
-                # note like "colA↔colB"
-                self._update_progress(step_inc=1, note=f"{a_col}↔{b_col}")
-            except Exception:
-                pass
-            else:
-                # Text compare: เท่ากันแบบตรงตัว (trim)
-                sa = sub[a_name].astype(str).str.strip()
-                sb = sub[b_name].astype(str).str.strip()
-                mism = sub.loc[sa != sb].copy()
-                if not mism.empty:
-                    mism["mapped_column"] = f"{a_col} ↔ {b_col}"
-                    mism["A_value"] = sa.loc[mism.index].values
-                    mism["B_value"] = sb.loc[mism.index].values
-                    mism["diff"] = ""
-                    mism["rule"] = "text_equal"
-                    rows.append(mism[on_keys + ["mapped_column","A_value","B_value","diff","rule"]])
-
-            # progress increment for this mapping (after numeric/text compare)
-            try:
-                map_idx += 1
-                self._update_progress(step_inc=1, note=f"{a_col}↔{b_col}")
-            except Exception:
-                pass
+        self._set_table(self.tbl_dup_a, self._dup_a_df)
+        self._set_table(self.tbl_dup_b, self._dup_b_df)
+        self._set_table(self.tbl_valdiff, self._valdiff_df)
 
-        if not rows:
-            # if there was no mismatch, still update progress finish for maps
-            try:
-                if total_maps and getattr(self, '_prog_task', None):
-                    # ensure progress gets to the end of the reserved map steps
-                    remaining = max(0, total_maps - map_idx)
-                    if remaining:
-                        self._update_progress(step_inc=remaining)
-            except Exception:
-                pass
-            return pd.DataFrame(columns=on_keys + ["mapped_column","A_value","B_value","diff","rule"])
-        out = pd.concat(rows, ignore_index=True)
-        return out
+        self.btn_save_report.setEnabled(True)
+        self.btn_export_cov.setEnabled(True)
+        self.btn_export_mm.setEnabled(True)
+        self.btn_export_val.setEnabled(self._valdiff_df is not None and len(self._valdiff_df) > 0)
+
+        self._stack.setCurrentWidget(self.page_results)
+        more = f" ค่าไม่ตรง:{len(self._valdiff_df):,}" if isinstance(self._valdiff_df, pd.DataFrame) and len(self._valdiff_df) > 0 else ""
+        self._status.showMessage(f"เปรียบเทียบเสร็จ ✅ – เฉพาะไฟล์1:{len(self._only_a_df):,} เฉพาะไฟล์2:{len(self._only_b_df):,} ตรงกัน(ตัวอย่าง):{len(self._both_df):,}{more}")
 
     # ------------- UI helpers -------------
-    def _set_table(self, tv: QtWidgets.QTableView, df: Optional[pd.DataFrame]):
+    def _set_table(self, tv: QtWidgets.QTableView, df: Optional[pd.DataFrame], structural: bool = False):
+        """structural=True เมื่อโหลดไฟล์ใหม่/เคลียร์; รัน compare ซ้ำ (เช่นปรับ tolerance) ใช้ False เพื่อคง scroll"""
         model = tv.model()
         if isinstance(model, PandasModel):
-            model.set_df(df)
+            was_empty = model.rowCount() == 0
+            reset = model.update_df(df, structural=structural)
         else:
             m = PandasModel(df)
             tv.setModel(m)
             set_table_defaults(tv)
+            was_empty = reset = True
         if df is not None:
             for col in range(tv.model().columnCount()):
                 tv.setColumnHidden(col, False)
-        tv.resizeColumnsToContents()
+        # คอลัมน์เดิม (compare ซ้ำ) → คงความกว้างที่ผู้ใช้ปรับไว้; วัดใหม่เฉพาะตอน reset/เดิมว่าง
+        # และวัดจากแถวบนสุด _FIT_SAMPLE_ROWS แถว (ค่า default ของ Qt คือ 1000 แถวต่อคอลัมน์)
+        if reset or was_empty:
+            tv.horizontalHeader().setResizeContentsPrecision(self._FIT_SAMPLE_ROWS)
+            tv.resizeColumnsToContents()
 
     # ------------- save summary report (HTML for Lead/PO) -------------
     def _save_summary_report(self):
@@ -913,12 +2374,19 @@ class CompareWindow(QtWidgets.QMainWindow):
             with self._busy("บันทึก Summary Report"):
                 self._start_progress("บันทึก Summary Report", total_steps=1)
                 
-                # Generate HTML report
-                html = self._generate_summary_report_html()
-                
-                # Write to file
-                with open(path, 'w', encoding='utf-8') as f:
-                    f.write(html)
+                # Generate HTML report แล้วเขียนทีละส่วนลงไฟล์ (ไม่ต่อส่วนหัว+CSS กับ body เป็น string ใหม่)
+                # เขียนลงไฟล์ .tmp ก่อนแล้วค่อยแทนที่ – ถ้าสร้างรายงานพัง ไฟล์เดิมของผู้ใช้จะไม่ถูกทับเป็นไฟล์ครึ่ง ๆ
+                tmp_path = path + ".tmp"
+                try:
+                    with open(tmp_path, 'w', encoding='utf-8') as f:
+                        f.writelines(self._iter_summary_report_html())
+                    os.replace(tmp_path, path)
+                except BaseException:
+                    try:
+                        os.remove(tmp_path)
+                    except OSError:
+                        pass
+                    raise
                 
                 self._update_progress(step_inc=1, note="บันทึกแล้ว")
                 self._finish_progress("บันทึกรายงาน ✅")
@@ -927,8 +2395,8 @@ class CompareWindow(QtWidgets.QMainWindow):
         except Exception as e:
             QtWidgets.QMessageBox.critical(self, "ข้อผิดพลาด", f"ไม่สามารถบันทึกรายงานได้: {e}")
 
-    def _generate_summary_report_html(self) -> str:
-        """Generate professional HTML report"""
+    def _iter_summary_report_html(self) -> Iterable[str]:
+        """Generate professional HTML report (ส่วนหัว+CSS แล้วตามด้วย body)"""
         import datetime
         from pathlib import Path
         
@@ -969,389 +2437,115 @@ class CompareWindow(QtWidgets.QMainWindow):
             status = "⚠️ ตรงกันบางส่วน (มี value mismatch)"
             status_color = "#f97316"
         
-        # Build HTML
-        html = f"""<!DOCTYPE html>
-<html lang="th">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>เปรียบเทียบข้อมูล – Summary Report</title>
-    <style>
-        * {{ font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; }}
-        body {{
-            margin: 0;
-            padding: 20px;
-            background: #f5f5f5;
-        }}
-        .container {{
-            max-width: 1200px;
-            margin: 0 auto;
-            background: white;
-            border-radius: 8px;
-            padding: 30px;
-            box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-        }}
-        .header {{
-            text-align: center;
-            border-bottom: 3px solid #0066cc;
-            padding-bottom: 20px;
-            margin-bottom: 30px;
-        }}
-        .header h1 {{
-            margin: 0;
-            color: #0066cc;
-            font-size: 28px;
-        }}
-        .header .timestamp {{
-            color: #666;
-            margin-top: 10px;
-            font-size: 14px;
-        }}
-        .status-card {{
-            background: {status_color};
-            color: white;
-            padding: 20px;
-            border-radius: 8px;
-            margin-bottom: 30px;
-            text-align: center;
-            font-size: 18px;
-            font-weight: bold;
-        }}
-        .grid {{
-            display: grid;
-            grid-template-columns: 1fr 1fr;
-            gap: 20px;
-            margin-bottom: 30px;
-        }}
-        .card {{
-            background: #f9fafb;
-            border: 1px solid #e5e7eb;
-            border-radius: 8px;
-            padding: 20px;
-        }}
-        .card h2 {{
-            margin-top: 0;
-            color: #1f2937;
-            font-size: 16px;
-            border-bottom: 2px solid #0066cc;
-            padding-bottom: 10px;
-        }}
-        .metric {{
-            display: flex;
-            justify-content: space-between;
-            padding: 8px 0;
-            border-bottom: 1px solid #e5e7eb;
-        }}
-        .metric:last-child {{
-            border-bottom: none;
-        }}
-        .metric-label {{
-            color: #666;
-            font-weight: 500;
-        }}
-        .metric-value {{
-            color: #0066cc;
-            font-weight: bold;
-            font-size: 14px;
-        }}
-        .metric-percent {{
-            color: #059669;
-            font-weight: bold;
-        }}
-        .section {{
-            margin-top: 30px;
-            border-top: 2px solid #e5e7eb;
-            padding-top: 20px;
-        }}
-        .section h3 {{
-            color: #1f2937;
-            margin-top: 0;
-            border-bottom: 2px solid #0066cc;
-            padding-bottom: 10px;
-        }}
-        .detail {{
-            background: #f0f9ff;
-            padding: 12px;
-            border-left: 4px solid #0066cc;
-            margin: 10px 0;
-            border-radius: 4px;
-        }}
-        table {{
-            width: 100%;
-            border-collapse: collapse;
-            margin-top: 10px;
-            font-size: 13px;
-        }}
-        th {{
-            background: #0066cc;
-            color: white;
-            padding: 10px;
-            text-align: left;
-            font-weight: bold;
-        }}
-        td {{
-            padding: 8px 10px;
-            border-bottom: 1px solid #e5e7eb;
-        }}
-        tr:nth-child(even) {{
-            background: #f9fafb;
-        }}
-        .footer {{
-            margin-top: 40px;
-            padding-top: 20px;
-            border-top: 2px solid #e5e7eb;
-            color: #666;
-            font-size: 12px;
-            text-align: center;
-        }}
-        .signature {{
-            display: grid;
-            grid-template-columns: 1fr 1fr 1fr;
-            gap: 30px;
-            margin-top: 30px;
-            text-align: center;
-        }}
-        .sig-line {{
-            height: 1px;
-            background: #000;
-            margin: 5px 0;
-        }}
-        .warning {{
-            background: #fff7ed;
-            border-left: 4px solid #ea580c;
-            padding: 12px;
-            margin: 10px 0;
-            border-radius: 4px;
-        }}
-        .success {{
-            background: #f0fdf4;
-            border-left: 4px solid #16a34a;
-            padding: 12px;
-            margin: 10px 0;
-            border-radius: 4px;
-        }}
-    </style>
-</head>
-<body>
-    <div class="container">
-        <div class="header">
-            <h1>📊 Reconciliation Comparison Report</h1>
-            <div class="timestamp">{timestamp}</div>
-        </div>
-        
-        <div class="status-card">{status}</div>
-        
-        <div class="grid">
-            <div class="card">
-                <h2>📄 File 1 (A)</h2>
-                <div class="metric">
-                    <span class="metric-label">ชื่อไฟล์:</span>
-                    <span>{file_a_name}</span>
-                </div>
-                <div class="metric">
-                    <span class="metric-label">จำนวนแถว:</span>
-                    <span class="metric-value">{total_keys_a:,}</span>
-                </div>
-                <div class="metric">
-                    <span class="metric-label">ตรงกัน:</span>
-                    <span class="metric-value">{both_count:,} <span class="metric-percent">({cov_a:.1f}%)</span></span>
-                </div>
-                <div class="metric">
-                    <span class="metric-label">เฉพาะไฟล์นี้:</span>
-                    <span class="metric-value">{only_a_count:,}</span>
-                </div>
-                <div class="metric">
-                    <span class="metric-label">คีย์ซ้ำ:</span>
-                    <span class="metric-value">{dup_a_count:,}</span>
-                </div>
-                <div class="detail">
-                    <strong>คีย์:</strong> {', '.join(keys_a) if keys_a else 'N/A'}
-                </div>
-            </div>
-            
-            <div class="card">
-                <h2>📄 File 2 (B)</h2>
-                <div class="metric">
-                    <span class="metric-label">ชื่อไฟล์:</span>
-                    <span>{file_b_name}</span>
-                </div>
-                <div class="metric">
-                    <span class="metric-label">จำนวนแถว:</span>
-                    <span class="metric-value">{total_keys_b:,}</span>
-                </div>
-                <div class="metric">
-                    <span class="metric-label">ตรงกัน:</span>
-                    <span class="metric-value">{both_count:,} <span class="metric-percent">({cov_b:.1f}%)</span></span>
-                </div>
-                <div class="metric">
-                    <span class="metric-label">เฉพาะไฟล์นี้:</span>
-                    <span class="metric-value">{only_b_count:,}</span>
-                </div>
-                <div class="metric">
-                    <span class="metric-label">คีย์ซ้ำ:</span>
-                    <span class="metric-value">{dup_b_count:,}</span>
-                </div>
-                <div class="detail">
-                    <strong>คีย์:</strong> {', '.join(keys_b) if keys_b else 'N/A'}
-                </div>
-            </div>
-        </div>
-        
-        <div class="section">
-            <h3>📈 สรุปผลการเปรียบเทียบ</h3>
-            <table>
-                <tr>
-                    <th>หมวดหมู่</th>
-                    <th>จำนวน</th>
-                    <th>หมายเหตุ</th>
-                </tr>
-                <tr>
-                    <td>✅ ตรงกัน (ทั้งสองไฟล์)</td>
-                    <td style="color: #16a34a; font-weight: bold;">{both_count:,}</td>
-                    <td>Data integrity OK</td>
-                </tr>
-                <tr>
-                    <td>⚠️ เฉพาะไฟล์ 1 เท่านั้น</td>
-                    <td style="color: #ea580c; font-weight: bold;">{only_a_count:,}</td>
-                    <td>Missing in File B</td>
-                </tr>
-                <tr>
-                    <td>⚠️ เฉพาะไฟล์ 2 เท่านั้น</td>
-                    <td style="color: #ea580c; font-weight: bold;">{only_b_count:,}</td>
-                    <td>Missing in File A</td>
-                </tr>
-                <tr>
-                    <td>❌ ค่าไม่ตรงกัน</td>
-                    <td style="color: #dc2626; font-weight: bold;">{valdiff_count:,}</td>
-                    <td>Value mismatch in mapped columns</td>
-                </tr>
-                <tr>
-                    <td>🔄 คีย์ซ้ำ (A)</td>
-                    <td style="color: #0066cc; font-weight: bold;">{dup_a_count:,}</td>
-                    <td>Duplicate keys in File A</td>
-                </tr>
-                <tr>
-                    <td>🔄 คีย์ซ้ำ (B)</td>
-                    <td style="color: #0066cc; font-weight: bold;">{dup_b_count:,}</td>
-                    <td>Duplicate keys in File B</td>
-                </tr>
-            </table>
-        </div>
-        
-        <div class="section">
-            <h3>✅ ข้อเสนอแนะ</h3>
-"""
-        
-        # Add recommendations
+        # ข้อเสนอแนะ (ต่อด้วย join) แล้ว format body ครั้งเดียว; ส่วนหัว/CSS ต่อไว้แล้วตอน import
+        recs = []
         if only_a_count > 0:
-            html += f'<div class="warning">🔍 มีข้อมูลจำนวน {only_a_count:,} แถวใน File 1 ที่ไม่ปรากฏใน File 2 ควรตรวจสอบว่าเป็นข้อมูลใหม่หรือข้อมูลเดิม</div>'
-        
+            recs.append(f'<div class="warning">🔍 มีข้อมูลจำนวน {only_a_count:,} แถวใน File 1 ที่ไม่ปรากฏใน File 2 ควรตรวจสอบว่าเป็นข้อมูลใหม่หรือข้อมูลเดิม</div>')
         if only_b_count > 0:
-            html += f'<div class="warning">🔍 มีข้อมูลจำนวน {only_b_count:,} แถวใน File 2 ที่ไม่ปรากฏใน File 1 ควรตรวจสอบว่าเป็นข้อมูลใหม่หรือข้อมูลเดิม</div>'
-        
+            recs.append(f'<div class="warning">🔍 มีข้อมูลจำนวน {only_b_count:,} แถวใน File 2 ที่ไม่ปรากฏใน File 1 ควรตรวจสอบว่าเป็นข้อมูลใหม่หรือข้อมูลเดิม</div>')
         if valdiff_count > 0:
-            html += f'<div class="warning">❌ พบค่าไม่ตรงกัน {valdiff_count:,} แถว ในส่วนของ mapping columns - ต้องตรวจสอบและแก้ไขต่อ</div>'
-        
+            recs.append(f'<div class="warning">❌ พบค่าไม่ตรงกัน {valdiff_count:,} แถว ในส่วนของ mapping columns - ต้องตรวจสอบและแก้ไขต่อ</div>')
         if dup_a_count > 0:
-            html += f'<div class="warning">⚠️ File 1 มีคีย์ที่ซ้ำกัน {dup_a_count:,} ชุด - ควรทำความเข้าใจเหตุผล</div>'
-        
+            recs.append(f'<div class="warning">⚠️ File 1 มีคีย์ที่ซ้ำกัน {dup_a_count:,} ชุด - ควรทำความเข้าใจเหตุผล</div>')
         if dup_b_count > 0:
-            html += f'<div class="warning">⚠️ File 2 มีคีย์ที่ซ้ำกัน {dup_b_count:,} ชุด - ควรทำความเข้าใจเหตุผล</div>'
-        
+            recs.append(f'<div class="warning">⚠️ File 2 มีคีย์ที่ซ้ำกัน {dup_b_count:,} ชุด - ควรทำความเข้าใจเหตุผล</div>')
         if only_a_count == 0 and only_b_count == 0 and valdiff_count == 0 and dup_a_count == 0 and dup_b_count == 0:
-            html += '<div class="success">🎉 ยอดเยี่ยม! ข้อมูลตรงกันทั้งหมด ไม่มีปัญหา</div>'
-        
-        html += """
-        </div>
-        
-        <div class="footer">
-            <p>📋 Report generated by Fulfillment Reconcile GUI</p>
-            <p>💡 สำหรับคำถามหรือปัญหา กรุณาติดต่อ Data Team</p>
-        </div>
-    </div>
-</body>
-</html>
-"""
-        return html
+            recs.append('<div class="success">🎉 ยอดเยี่ยม! ข้อมูลตรงกันทั้งหมด ไม่มีปัญหา</div>')
+
+        yield _REPORT_PREFIX
+        yield _REPORT_BODY_TEMPLATE.format(
+            timestamp=timestamp, status=status, status_color=status_color,
+            file_a_name=file_a_name, total_keys_a=total_keys_a, cov_a=cov_a,
+            only_a_count=only_a_count, dup_a_count=dup_a_count,
+            key_text_a=", ".join(keys_a) if keys_a else "N/A",
+            file_b_name=file_b_name, total_keys_b=total_keys_b, cov_b=cov_b,
+            only_b_count=only_b_count, dup_b_count=dup_b_count,
+            key_text_b=", ".join(keys_b) if keys_b else "N/A",
+            both_count=both_count, valdiff_count=valdiff_count,
+            recommendations="".join(recs),
+        )
 
     # ------------- exporters -------------
+    def _start_export(self, path: str, sections: List[Tuple[str, Optional[str], pd.DataFrame]],
+                      task: str, done_msg: str):
+        """เขียนไฟล์บน QThread (เหมือน compare) – progress/ผลลัพธ์กลับมาทาง signal"""
+        worker = ExportWorker(path, sections, self._arrow_cache)
+        thread = QtCore.QThread(self)
+        worker.moveToThread(thread)
+        thread.started.connect(worker.run)
+        worker.progress.connect(self._update_progress)
+        worker.finished.connect(self._on_export_finished)
+        worker.failed.connect(self._on_export_failed)
+        worker.finished.connect(thread.quit)
+        worker.failed.connect(thread.quit)
+        job = (thread, worker)
+        self._export_jobs.add(job)  # ถือ ref ไว้จน thread จบจริง
+        thread.finished.connect(lambda: self._export_jobs.discard(job))
+        thread.finished.connect(worker.deleteLater)
+        thread.finished.connect(thread.deleteLater)
+
+        self._export_done_msg = done_msg
+        self._start_progress(task, total_steps=2)
+        thread.start()
+
+    def _export_busy(self) -> bool:
+        if self._export_jobs:
+            QtWidgets.QMessageBox.information(self, "ส่งออก", "กำลังส่งออกไฟล์ก่อนหน้าอยู่ โปรดรอสักครู่")
+            return True
+        return False
+
+    def _on_export_finished(self, path: str):
+        self._update_progress(step_inc=1, note="บันทึกไฟล์แล้ว")
+        self._finish_progress("ส่งออกเสร็จแล้ว ✅")
+        QtWidgets.QMessageBox.information(self, "ส่งออก", self._export_done_msg)
+
+    def _on_export_failed(self, msg: str):
+        self._finish_progress("ส่งออกไม่สำเร็จ ❌")
+        QtWidgets.QMessageBox.critical(self, "ข้อผิดพลาด", f"ไม่สามารถส่งออกได้: {msg}")
+
     def _export_coverage(self):
         if self._only_a_df is None and self._only_b_df is None and self._both_df is None:
             QtWidgets.QMessageBox.information(self, "ส่งออก", "ยังไม่มีผลการเปรียบเทียบ")
             return
+        if self._export_busy():
+            return
         path, _ = QtWidgets.QFileDialog.getSaveFileName(self, "บันทึกการครอบคลุม", "coverage.xlsx",
-                                                        "Excel (*.xlsx);;CSV (*.csv)")
+                                                        _EXPORT_FILTER)
         if not path:
             return
-        try:
-            with self._busy("ส่งออกการครอบคลุม"):
-                # progress: simple two-step (prepare -> write)
-                self._start_progress("ส่งออกการครอบคลุม", total_steps=2)
-                if str(path).lower().endswith(".csv"):
-                    parts = []
-                    if self._only_a_df is not None: parts.append(self._only_a_df.assign(section="เฉพาะไฟล์1"))
-                    if self._only_b_df is not None: parts.append(self._only_b_df.assign(section="เฉพาะไฟล์2"))
-                    if self._both_df is not None: parts.append(self._both_df.assign(section="ตรงกัน(ตัวอย่าง)"))
-                    pd.concat(parts, ignore_index=True).to_csv(path, index=False, encoding="utf-8")
-                else:
-                    with pd.ExcelWriter(path) as xw:
-                        if self._only_a_df is not None: self._only_a_df.to_excel(xw, index=False, sheet_name="เฉพาะไฟล์1")
-                        if self._only_b_df is not None: self._only_b_df.to_excel(xw, index=False, sheet_name="เฉพาะไฟล์2")
-                        if self._both_df is not None: self._both_df.to_excel(xw, index=False, sheet_name="ตรงกัน_ตัวอย่าง")
-                # mark write step
-                self._update_progress(step_inc=1, note="บันทึกไฟล์แล้ว")
-                self._finish_progress("ส่งออกเสร็จแล้ว ✅")
-            QtWidgets.QMessageBox.information(self, "ส่งออก", f"✅ บันทึกสำเร็จที่:\n{path}")
-        except Exception as e:
-            QtWidgets.QMessageBox.critical(self, "ข้อผิดพลาด", f"ไม่สามารถส่งออกได้: {e}")
+        sections = []
+        if self._only_a_df is not None: sections.append(("เฉพาะไฟล์1", "เฉพาะไฟล์1", self._only_a_df))
+        if self._only_b_df is not None: sections.append(("เฉพาะไฟล์2", "เฉพาะไฟล์2", self._only_b_df))
+        if self._both_df is not None: sections.append(("ตรงกัน_ตัวอย่าง", "ตรงกัน(ตัวอย่าง)", self._both_df))
+        self._start_export(path, sections, "ส่งออกการครอบคลุม", f"✅ บันทึกสำเร็จที่:\n{path}")
 
     def _export_duplicates(self):
         if self._dup_a_df is None and self._dup_b_df is None:
             QtWidgets.QMessageBox.information(self, "ส่งออก", "ไม่มีคีย์ที่ซ้ำกัน")
             return
+        if self._export_busy():
+            return
         path, _ = QtWidgets.QFileDialog.getSaveFileName(self, "บันทึกคีย์ที่ซ้ำ", "duplicates.xlsx",
-                                                        "Excel (*.xlsx);;CSV (*.csv)")
+                                                        _EXPORT_FILTER)
         if not path:
             return
-        try:
-            with self._busy("ส่งออกคีย์ที่ซ้ำ"):
-                self._start_progress("ส่งออกคีย์ที่ซ้ำ", total_steps=2)
-                if str(path).lower().endswith(".csv"):
-                    parts = []
-                    if self._dup_a_df is not None: parts.append(self._dup_a_df.assign(section="ไฟล์1"))
-                    if self._dup_b_df is not None: parts.append(self._dup_b_df.assign(section="ไฟล์2"))
-                    pd.concat(parts, ignore_index=True).to_csv(path, index=False, encoding="utf-8")
-                else:
-                    with pd.ExcelWriter(path) as xw:
-                        if self._dup_a_df is not None: self._dup_a_df.to_excel(xw, index=False, sheet_name="ไฟล์1_ซ้ำ")
-                        if self._dup_b_df is not None: self._dup_b_df.to_excel(xw, index=False, sheet_name="ไฟล์2_ซ้ำ")
-                self._update_progress(step_inc=1, note="บันทึกไฟล์แล้ว")
-                self._finish_progress("ส่งออกเสร็จแล้ว ✅")
-            QtWidgets.QMessageBox.information(self, "ส่งออก", f"✅ บันทึกสำเร็จที่:\n{path}")
-        except Exception as e:
-            QtWidgets.QMessageBox.critical(self, "ข้อผิดพลาด", f"ไม่สามารถส่งออกได้: {e}")
+        sections = []
+        if self._dup_a_df is not None: sections.append(("ไฟล์1_ซ้ำ", "ไฟล์1", self._dup_a_df))
+        if self._dup_b_df is not None: sections.append(("ไฟล์2_ซ้ำ", "ไฟล์2", self._dup_b_df))
+        self._start_export(path, sections, "ส่งออกคีย์ที่ซ้ำ", f"✅ บันทึกสำเร็จที่:\n{path}")
 
     def _export_valdiff(self):
         if self._valdiff_df is None or len(self._valdiff_df) == 0:
             QtWidgets.QMessageBox.information(self, "ส่งออก", "ไม่มีค่าที่ไม่ตรงกัน")
             return
+        if self._export_busy():
+            return
         path, _ = QtWidgets.QFileDialog.getSaveFileName(self, "บันทึกค่าที่ไม่ตรงกัน", "value_diff.xlsx",
-                                                        "Excel (*.xlsx);;CSV (*.csv)")
+                                                        _EXPORT_FILTER)
         if not path:
             return
-        try:
-            with self._busy("ส่งออกค่าที่ไม่ตรงกัน"):
-                self._start_progress("ส่งออกค่าไม่ตรง", total_steps=2)
-                if str(path).lower().endswith(".csv"):
-                    self._valdiff_df.to_csv(path, index=False, encoding="utf-8")
-                else:
-                    with pd.ExcelWriter(path) as xw:
-                        self._valdiff_df.to_excel(xw, index=False, sheet_name="ค่าไม่ตรง")
-                self._update_progress(step_inc=1, note="บันทึกไฟล์แล้ว")
-                self._finish_progress("ส่งออกเสร็จแล้ว ✅")
-            QtWidgets.QMessageBox.information(self, "ส่งออก", f"✅ บันทึกสำเร็จที่:\n{path}\n\nจำนวนแถวที่ไม่ตรง: {len(self._valdiff_df):,}")
-        except Exception as e:
-            QtWidgets.QMessageBox.critical(self, "ข้อผิดพลาด", f"ไม่สามารถส่งออกได้: {e}")
+        self._start_export(path, [("ค่าไม่ตรง", None, self._valdiff_df)], "ส่งออกค่าไม่ตรง",
+                           f"✅ บันทึกสำเร็จที่:\n{path}\n\nจำนวนแถวที่ไม่ตรง: {len(self._valdiff_df):,}")
 
 
 # =============================
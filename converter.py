@@ -1,49 +1,103 @@
+import codecs
 import sys
+import numpy as np
 import pandas as pd
 from PyQt5 import QtWidgets
 from PyQt5.QtWidgets import (
     QApplication, QWidget, QVBoxLayout, QHBoxLayout, QFileDialog,
-    QTableWidget, QTableWidgetItem, QPushButton, QLineEdit, QLabel,
+    QTableView, QPushButton, QLineEdit, QLabel,
     QMessageBox, QComboBox
 )
 
+from file_block import PandasModel
+
 # ---------- Core Conversion ----------
+_SNIFF_BYTES = 64 * 1024
+
+
+def _decodes_head(file_path, enc):
+    # ลอง decode ต้นไฟล์ก่อน: encoding ผิดส่วนใหญ่เจอตั้งแต่ช่วงแรก → ไม่ต้อง parse ทั้งไฟล์แล้วค่อยพัง
+    # (incremental decoder: ตัวอักษรหลาย byte ที่ขาดตรงท้ายก้อนไม่นับเป็น error)
+    with open(file_path, 'rb') as f:
+        head = f.read(_SNIFF_BYTES)
+    try:
+        codecs.getincrementaldecoder(enc)().decode(head, final=False)
+        return True
+    except UnicodeDecodeError:
+        return False
+
+
 def try_read_csv(file_path, nrows_preview=100):
     encodings = ['utf-8', 'windows-874', 'tis-620']
     for enc in encodings:
         try:
-            df_preview = pd.read_csv(file_path, encoding=enc, nrows=nrows_preview)
+            if not _decodes_head(file_path, enc):
+                print(f"❌ {enc}: decode error")
+                continue
+            # อ่านทั้งไฟล์ครั้งเดียว แล้ว preview = แถวแรกของผลเดิม (ไม่ต้อง parse ซ้ำ)
             df_full = pd.read_csv(file_path, encoding=enc)
             print(f"✅ Loaded with encoding: {enc}")
-            return df_preview, df_full, enc
+            return df_full.head(nrows_preview), df_full, enc
         except Exception as e:
             print(f"❌ {enc}: {e}")
     raise ValueError("ไม่สามารถอ่านไฟล์นี้ได้ด้วย encoding ทั่วไป")
 
+def _fix_thai(val):
+    try:
+        return val.encode('latin1').decode('tis-620')
+    except Exception:
+        return val
+
+
 def convert_text_thai(series):
-    def _convert(val):
-        try:
-            return val.encode('latin1').decode('tis-620')
-        except Exception:
-            return val
-    return series.astype(str).map(_convert)
+    return _convert_thai_str(series.astype(str))
+
+
+def _convert_thai_str(series):
+    # series เป็น str อยู่แล้ว (ผ่าน astype(str) มาแล้ว) – ยกเว้นค่าว่าง: pandas 3 คง NaN ไว้ → ไม่แปลง คืนค่าเดิม
+    vals = series.to_numpy()
+    na = series.isna().to_numpy()
+    has_na = bool(na.any())
+    sub = vals[~na] if has_na else vals
+    # ทั้งคอลัมน์ในรอบเดียว: ต่อด้วย \x00 → encode/decode ครั้งเดียวใน C แล้ว split กลับ
+    # ถ้ามีค่าที่แปลงไม่ได้ (ต้องคืนค่าเดิมรายตัว) หรือมี \x00 อยู่ในค่าเอง (split แล้วจำนวนไม่เท่า) → ทีละค่า
+    try:
+        out = "\x00".join(sub).encode('latin1').decode('tis-620').split("\x00")
+    except (UnicodeError, TypeError):
+        out = None
+    if out is not None and len(out) == len(sub):
+        if has_na:
+            full = vals.astype(object)
+            full[~na] = out
+            out = full
+        return pd.Series(out, index=series.index, name=series.name, dtype=object)
+    # ทีละค่าเฉพาะค่า unique (ข้อความซ้ำกันเยอะ) แล้ว take กลับตามตำแหน่ง (NA เป็น unique ตัวหนึ่ง → คืนค่าเดิม)
+    codes, uniques = pd.factorize(series, use_na_sentinel=False)
+    fixed = np.array([_fix_thai(v) for v in uniques], dtype=object)
+    return pd.Series(fixed.take(codes), index=series.index, name=series.name)
+
+# Format Type → ฟังก์ชันแปลง (รับ series ที่ astype(str) แล้ว); ลำดับ key = ลำดับใน combobox
+_FMT_DISPATCH = {
+    "Thai Encoding Fix (TIS-620 → UTF-8)": _convert_thai_str,
+    "Uppercase": lambda s: s.str.upper(),
+    "Lowercase": lambda s: s.str.lower(),
+    "Trim Whitespace": lambda s: s.str.strip(),
+    "Capitalize Words": lambda s: s.str.title(),
+}
+
 
 def convert_text_generic(series, fmt_type):
     series = series.astype(str)
-    if fmt_type == "Thai Encoding Fix (TIS-620 → UTF-8)":
-        return convert_text_thai(series)
-    elif fmt_type == "Uppercase":
-        return series.str.upper()
-    elif fmt_type == "Lowercase":
-        return series.str.lower()
-    elif fmt_type == "Trim Whitespace":
-        return series.str.strip()
-    elif fmt_type == "Capitalize Words":
-        return series.str.title()
-    else:
-        return series
+    fn = _FMT_DISPATCH.get(fmt_type)
+    return fn(series) if fn is not None else series
 
 # ---------- GUI ----------
+class _PreviewModel(PandasModel):
+    # หน้าตาเดียวกับตาราง QTableWidget เดิม: ค่าว่างแสดงเป็น "nan"/"None" ตาม str(), เลขแถวเริ่มที่ 1
+    BLANK_NA = False
+    ROW_BASE = 1
+
+
 class ThaiEncodingConverter(QWidget):
     def __init__(self):
         super().__init__()
@@ -73,13 +127,7 @@ class ThaiEncodingConverter(QWidget):
 
         control_layout.addWidget(QLabel("Format Type:"))
         self.format_dropdown = QComboBox()
-        self.format_dropdown.addItems([
-            "Thai Encoding Fix (TIS-620 → UTF-8)",
-            "Uppercase",
-            "Lowercase",
-            "Trim Whitespace",
-            "Capitalize Words"
-        ])
+        self.format_dropdown.addItems(list(_FMT_DISPATCH))
         control_layout.addWidget(self.format_dropdown)
 
         self.btn_preview = QPushButton("Preview")
@@ -92,8 +140,10 @@ class ThaiEncodingConverter(QWidget):
 
         main_layout.addLayout(control_layout)
 
-        # Single Table Display
-        self.table = QTableWidget()
+        # Single Table Display (model ตัวเดียว – view ดึงเฉพาะ cell ที่มองเห็น ไม่สร้าง item ทีละ cell)
+        self.table = QTableView()
+        self.table_model = _PreviewModel()
+        self.table.setModel(self.table_model)
         main_layout.addWidget(self.table)
 
         # Export Button
@@ -131,13 +181,7 @@ class ThaiEncodingConverter(QWidget):
             QMessageBox.warning(self, "Error", f"ไม่สามารถโหลดไฟล์ได้:\\n{e}")
 
     def show_table(self, df):
-        self.table.clear()
-        self.table.setColumnCount(len(df.columns))
-        self.table.setRowCount(len(df))
-        self.table.setHorizontalHeaderLabels(df.columns)
-        for i in range(len(df)):
-            for j, col in enumerate(df.columns):
-                self.table.setItem(i, j, QTableWidgetItem(str(df.iloc[i, j])))
+        self.table_model.set_df(df)
         self.table.resizeColumnsToContents()
 
     def preview_conversion(self):
@@ -12,8 +12,9 @@ FileBlock widget (self-contained)
 """
 
 from pathlib import Path
-from typing import Optional, List, Tuple
+from typing import Optional, List, Tuple, Dict
 
+import numpy as np
 import pandas as pd
 from PyQt5 import QtCore, QtGui, QtWidgets
 
@@ -129,10 +130,28 @@ def apply_conditions(df: pd.DataFrame, conds: List[Tuple[str, str, str]]) -> pd.
 
 # ---------- PandasModel ----------
 
+def _column_display(s: pd.Series, blank_na: bool = True):
+    # ข้อความที่แสดงของทั้งคอลัมน์ (object array ของ str) ทำครั้งเดียวตอน set_df – preview ไม่เกิน 5k แถว
+    # numpy dtype ปกติ → array ตรง ๆ; datetime/timedelta/extension (Int64, string ฯลฯ) → object
+    # ให้ได้ Timestamp/pd.NA ตัวเดียวกับที่ iat คืน (str() เหมือนเดิม); NA → "" (ถ้า blank_na)
+    if isinstance(s.dtype, pd.api.extensions.ExtensionDtype) or s.dtype.kind in "mM":
+        vals = s.to_numpy(dtype=object)
+    else:
+        vals = s.to_numpy()
+    out = np.fromiter(map(str, vals), dtype=object, count=len(vals))
+    if blank_na:
+        out[pd.isna(vals)] = ""
+    return out
+
+
 class PandasModel(QtCore.QAbstractTableModel):
+    BLANK_NA = True  # False → NA แสดงเป็น str() ของค่า ("nan", "None", "<NA>")
+    ROW_BASE = 0     # เลขแถวแรกใน vertical header
+
     def __init__(self, df: Optional[pd.DataFrame] = None, parent=None):
         super().__init__(parent)
         self._df = df if df is not None else pd.DataFrame()
+        self._display = [_column_display(self._df.iloc[:, j], self.BLANK_NA) for j in range(self._df.shape[1])]
 
     def rowCount(self, parent=QtCore.QModelIndex()):
         return len(self._df)
@@ -144,10 +163,8 @@ class PandasModel(QtCore.QAbstractTableModel):
         if not index.isValid() or self._df is None:
             return None
         if role in (QtCore.Qt.DisplayRole, QtCore.Qt.EditRole):
-            val = self._df.iat[index.row(), index.column()]
-            if pd.isna(val):
-                return ""
-            return str(val)
+            # ข้อความที่เตรียมไว้ตอน set_df (ไม่ต้อง iat/pd.isna/str ทุก cell ทุกครั้งที่ repaint)
+            return self._display[index.column()][index.row()]
         return None
 
     def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
@@ -158,17 +175,19 @@ class PandasModel(QtCore.QAbstractTableModel):
                 return str(self._df.columns[section])
             except Exception:
                 return str(section)
-        return str(section)
+        return str(section + self.ROW_BASE)
 
     def set_df(self, df: pd.DataFrame):
         self.beginResetModel()
         self._df = df.copy() if df is not None else pd.DataFrame()
+        self._display = [_column_display(self._df.iloc[:, j], self.BLANK_NA) for j in range(self._df.shape[1])]
         self.endResetModel()
 
 # ---------- FileBlock widget ----------
 
 class FileBlock(QtWidgets.QGroupBox):
     dataChanged = QtCore.pyqtSignal()
+    KEY_HASH_CACHE_SIZE = 4  # จำนวน (df, keys) ที่เก็บ key hash ไว้ต่อ block
 
     def __init__(self, title: str):
         super().__init__(title)
@@ -224,6 +243,8 @@ class FileBlock(QtWidgets.QGroupBox):
 
         self.df_raw: Optional[pd.DataFrame] = None
         self.df_filtered: Optional[pd.DataFrame] = None
+        # (id(df), keys) -> (df, key_hash, keyrows) ของ compare (cached_key_hash/store_key_hash); ล้างเมื่อ df เปลี่ยน
+        self._key_hash_cache: Dict[tuple, tuple] = {}
 
         self.browse_btn.clicked.connect(self.on_browse)
         self.path_edit.editingFinished.connect(self.on_path_changed)
@@ -259,6 +280,7 @@ class FileBlock(QtWidgets.QGroupBox):
             QtWidgets.QMessageBox.warning(self, "Load error", f"{e}")
             return
         self.df_raw = df
+        self._key_hash_cache.clear()
         self.populate_columns(df.columns.tolist())
         self.refresh_preview()
         self.dataChanged.emit()
@@ -295,6 +317,7 @@ class FileBlock(QtWidgets.QGroupBox):
         if self.df_raw is None:
             return
         self.df_filtered = apply_conditions(self.df_raw, self.conditions())
+        self._key_hash_cache.clear()
         prev = self.df_filtered.head(5000)
         model = self.table.model()
         if isinstance(model, PandasModel):
@@ -306,6 +329,29 @@ class FileBlock(QtWidgets.QGroupBox):
     def current_df_or_none(self) -> Optional[pd.DataFrame]:
         return self.df_filtered if self.df_filtered is not None else self.df_raw
 
+    def cached_key_hash(self, df: pd.DataFrame, keys: List[str]) -> Optional[Tuple[pd.Series, pd.DataFrame]]:
+        """(key_hash, keyrows) ที่ compare เก็บไว้ถ้า df ตัวเดิม + keys เดิม ไม่งั้น None
+
+        ล้างเองเมื่อโหลด/กรองใหม่; df ของ aggregate เป็น object ใหม่ทุกครั้งจึง miss เอง
+        """
+        hit = self._key_hash_cache.get((id(df), tuple(keys)))
+        if hit is not None and hit[0] is df:
+            return hit[1], hit[2]
+        return None
+
+    def store_key_hash(self, df: pd.DataFrame, keys: List[str], key_hash: pd.Series, keyrows: pd.DataFrame):
+        cache = self._key_hash_cache
+        cache[(id(df), tuple(keys))] = (df, key_hash, keyrows)
+        while len(cache) > self.KEY_HASH_CACHE_SIZE:
+            cache.pop(next(iter(cache)))
+
+    def drop_key_hash(self, df: Optional[pd.DataFrame]):
+        """ทิ้ง key hash ทุกชุดของ df นี้ (เช่น ผล aggregate เดิมที่ถูกแทนแล้ว) – cache ไม่ถือ df เก่าไว้อีก"""
+        if df is None:
+            return
+        for k in [k for k, v in self._key_hash_cache.items() if v[0] is df]:
+            del self._key_hash_cache[k]
+
     def set_keys(self, keys: List[str]):
         ks = keys + ["", "", ""]
         self.key1.setCurrentText(ks[0])
@@ -316,6 +362,7 @@ class FileBlock(QtWidgets.QGroupBox):
         self.path_edit.clear()
         self.df_raw = None
         self.df_filtered = None
+        self._key_hash_cache.clear()
         self.on_clear()
 
     def reload(self):
@@ -4,6 +4,14 @@ import pandas as pd
 from PyQt5 import QtWidgets
 from PyQt5.QtWidgets import QFileDialog, QMessageBox
 
+try:
+    import xlsxwriter
+except ImportError:  # optional – ไม่มีก็ export .xlsx ผ่าน openpyxl
+    xlsxwriter = None
+
+# Excel รับได้สูงสุด 1,048,576 แถวต่อ sheet (รวมหัวตาราง); xlsxwriter เงียบ ๆ ข้ามแถวที่เกิน
+_XLSX_MAX_ROWS = 1_048_576
+
 
 class LookupApp(QtWidgets.QWidget):
     def __init__(self):
@@ -322,10 +330,24 @@ class LookupApp(QtWidgets.QWidget):
             is_first_chunk = True
             is_xlsx = path.lower().endswith('.xlsx')
             
-            if is_xlsx:
+            writer = None
+            workbook = sheet = None
+            next_row = 0
+            if is_xlsx and xlsxwriter is not None:
+                if len(self.target_df) + 1 > _XLSX_MAX_ROWS:
+                    raise ValueError(
+                        f"Target มี {len(self.target_df):,} แถว เกินที่ Excel รองรับ ({_XLSX_MAX_ROWS - 1:,}) – ส่งออกเป็น CSV แทน")
+                # constant_memory: flush ทีละแถว RAM คงที่ ไม่ต้องถือทั้ง workbook แบบ openpyxl
+                workbook = xlsxwriter.Workbook(path, {
+                    "constant_memory": True,
+                    "nan_inf_to_errors": True,
+                    "strings_to_formulas": False,
+                    "strings_to_urls": False,
+                    "default_date_format": "yyyy-mm-dd hh:mm:ss",
+                })
+                sheet = workbook.add_worksheet('Result')
+            elif is_xlsx:
                 writer = pd.ExcelWriter(path, engine='openpyxl')
-            else:
-                writer = None
             
             try:
                 for chunk_idx in range(0, len(target_renamed), chunk_size):
@@ -342,7 +364,20 @@ class LookupApp(QtWidgets.QWidget):
                     merged_chunk[result_col] = merged_chunk[f"{master_value}_master"]
                     
                     # Write to file
-                    if is_xlsx:
+                    if sheet is not None:
+                        if is_first_chunk:
+                            sheet.write_row(0, 0, [str(c) for c in merged_chunk.columns])
+                            next_row = 1
+                        # join แบบ inner กับ master ที่คีย์ซ้ำ → แถวผลลัพธ์เกิน target ได้ ตรวจทุก chunk
+                        if next_row + len(merged_chunk) > _XLSX_MAX_ROWS:
+                            raise ValueError(
+                                f"ผลลัพธ์เกิน {_XLSX_MAX_ROWS - 1:,} แถวที่ Excel รองรับ – ส่งออกเป็น CSV แทน")
+                        rows = merged_chunk.astype(object)
+                        rows = rows.where(rows.notna(), None)
+                        for row in rows.itertuples(index=False, name=None):
+                            sheet.write_row(next_row, 0, row)
+                            next_row += 1
+                    elif is_xlsx:
                         merged_chunk.to_excel(
                             writer,
                             sheet_name='Result',
@@ -360,7 +395,9 @@ class LookupApp(QtWidgets.QWidget):
                     self._update_progress(step_inc=1, note=f"chunk {(chunk_idx // chunk_size) + 1}/{num_chunks}")
                     QtWidgets.QApplication.processEvents()
             finally:
-                if is_xlsx and writer:
+                if workbook is not None:
+                    workbook.close()
+                if writer is not None:
                     writer.close()
             
             self._update_progress(step_inc=1, note="finalized")
@@ -0,0 +1,125 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+from pandas.util import hash_array
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import compare_view as cv  # noqa: E402
+
+
+def _text_hash(vals):
+    # hash แบบเดิม: แปลงทุกค่าเป็น str แล้ว hash ทีละค่า
+    return hash_array(np.asarray(vals, dtype=object).astype(str).astype(object), categorize=False)
+
+
+def test_mixed_object_keys_hash_like_text():
+    vals = np.array([1, 1.0, "x", True, 1, "1"], dtype=object)
+    assert (cv._hash_key_values(vals) == _text_hash(vals)).all()
+
+
+def test_mixed_object_keys_large_column_hash_like_text():
+    # เกิน _INTERN_SAMPLE และซ้ำเยอะ (เข้าทาง factorize ถ้าเป็น str ล้วน)
+    vals = np.array([1, 1.0, True, "x"] * 5000, dtype=object)
+    assert (cv._hash_key_values(vals) == _text_hash(vals)).all()
+
+
+def test_mixed_object_key_hash_independent_of_other_rows():
+    a = pd.DataFrame({"k": pd.Series([1, 1.0, "x"], dtype=object)})
+    b = pd.DataFrame({"k": pd.Series([1.0, "x"], dtype=object)})
+    ha = cv.build_key_hash(a, ["k"]).to_numpy()
+    hb = cv.build_key_hash(b, ["k"]).to_numpy()
+    assert ha[0] != ha[1]  # 1 กับ 1.0 เป็นคนละคีย์ (text "1" / "1.0")
+    assert ha[1] == hb[0]
+    assert ha[2] == hb[1]
+
+
+def test_csv_export_text_same_with_and_without_arrow(tmp_path, monkeypatch):
+    pytest.importorskip("pyarrow")
+    df = pd.DataFrame({
+        "d": pd.to_datetime(["2024-01-01 10:00:00", None]),
+        "b": [True, False],
+        "f": [1.0, np.nan],
+        "s": ["a", "b,c"],
+    })
+    parts = [(df, "x"), (df[["s"]], "y")]
+    cv._write_csv(str(tmp_path / "arrow.csv"), parts)
+    monkeypatch.setattr(cv, "pa", None)
+    cv._write_csv(str(tmp_path / "pandas.csv"), parts)
+    # Arrow ใส่ "" รอบข้อความ → เทียบหลัง parse
+    read = lambda p: pd.read_csv(tmp_path / p, dtype=str, keep_default_na=False)
+    pd.testing.assert_frame_equal(read("arrow.csv"), read("pandas.csv"))
+    assert read("arrow.csv")["d"].tolist() == ["2024-01-01 10:00:00", "", "", ""]
+
+
+def test_na_key_does_not_match_empty_text():
+    df = pd.DataFrame({"k": pd.Series(["x", None, ""], dtype=object)})
+    h = cv.build_key_hash(df, ["k"]).to_numpy()
+    assert h[1] != h[2]
+
+
+def test_na_key_matches_empty_text_when_treat_na_as_empty():
+    df = pd.DataFrame({"k": pd.Series(["x", None, ""], dtype=object)})
+    h = cv.build_key_hash(df, ["k"], treat_na_as_empty=True).to_numpy()
+    assert h[1] == h[2]
+
+
+def test_na_key_matches_across_int_and_str_dtypes():
+    a = pd.DataFrame({"k": pd.array([1, None], dtype="Int64"), "k2": ["a", "a"]})
+    b = pd.DataFrame({"k": pd.Series(["1", None], dtype=object), "k2": ["a", "a"]})
+    ha = cv.build_key_hash(a, ["k", "k2"]).to_numpy()
+    hb = cv.build_key_hash(b, ["k", "k2"]).to_numpy()
+    assert (ha == hb).all()
+    assert ha[0] != ha[1]
+
+
+def _value_diff(df_a, df_b, keys_a, keys_b, pairs):
+    worker = cv.CompareWorker(df_a, df_b, keys_a, keys_b, pairs, 0.0, 0.0)
+    return worker._run()["valdiff"]
+
+
+def test_value_diff_joins_by_key_hash_across_key_names_and_dtypes():
+    a = pd.DataFrame({"id": [1, 2, 3], "amt": [10.0, 20.0, 30.0], "name": ["a", "b", "c"]})
+    b = pd.DataFrame({"bid": ["3", "1", "9"], "amt": [31.0, 10.0, 1.0], "name": ["c", "z", "q"]})
+    vd = _value_diff(a, b, ["id"], ["bid"], [("amt", "amt", "Numeric"), ("name", "name", "Text")])
+    got = sorted(zip(vd["id"].tolist(), vd["mapped_column"].tolist(),
+                     vd["A_value"].astype(str).tolist(), vd["B_value"].astype(str).tolist()))
+    assert got == [(1, "name ↔ name", "a", "z"), (3, "amt ↔ amt", "30.0", "31.0")]
+
+
+def test_value_diff_keeps_every_pair_for_duplicate_b_keys():
+    a = pd.DataFrame({"id": [1, 2], "amt": [10.0, 20.0]})
+    b = pd.DataFrame({"id": [2, 1, 2, 2], "amt": [20.0, 10.0, 25.0, 26.0]})
+    vd = _value_diff(a, b, ["id"], ["id"], [("amt", "amt", "Numeric")])
+    assert vd["id"].tolist() == [2, 2]
+    assert sorted(vd["B_value"].tolist()) == [25.0, 26.0]
+    assert (vd["A_value"] == 20.0).all()
+
+
+def test_pandas_model_formats_datetimes_like_str_across_tiles():
+    from PyQt5 import QtWidgets
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])  # noqa: F841
+    n = cv.PandasModel.TILE_ROWS + 1
+    ts = pd.Series(pd.Timestamp("2024-01-01"), index=range(n))
+    ts.iloc[-1] = pd.Timestamp("2024-01-02 10:30:00")
+    df = pd.DataFrame({"ts": ts, "td": pd.to_timedelta(1, unit="D"), "x": [None] + [1.5] * (n - 1)})
+    m = cv.PandasModel(df)
+    cell = lambda r, c: m.data(m.index(r, c))
+    assert cell(0, 0) == "2024-01-01 00:00:00"
+    assert cell(n - 1, 0) == "2024-01-02 10:30:00"
+    assert cell(0, 1) == "1 days 00:00:00"
+    assert cell(0, 2) == ""
+    assert cell(1, 2) == "1.5"
+
+
+def test_format_key_values_large_whole_floats_as_int():
+    vals = [1e20, -2.0 ** 63, 3.0, 1.5, np.nan]
+    f = cv._format_key_values(pd.Series(vals))
+    o = cv._format_key_values(pd.Series(vals + ["x"], dtype=object))
+    assert list(f[:4]) == ["100000000000000000000", "-9223372036854775808", "3", "1.5"]
+    assert f[4] is pd.NA
+    assert list(o[:4]) == list(f[:4])
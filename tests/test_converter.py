@@ -0,0 +1,34 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import converter  # noqa: E402
+
+
+def _expected(s):
+    # แบบเดิม: _fix_thai ทีละค่าหลัง astype(str)
+    return [converter._fix_thai(v) for v in s.astype(str)]
+
+
+def _same(got, want):
+    return all((pd.isna(g) and pd.isna(w)) or g == w for g, w in zip(got, want)) and len(got) == len(want)
+
+
+def test_convert_text_thai_with_missing_values():
+    s = pd.Series(["\xbe\xc3", None, np.nan, "abc"])
+    out = converter.convert_text_thai(s)
+    assert out.iloc[0] == "พร"
+    assert _same(out.tolist(), _expected(s))
+
+
+def test_convert_text_thai_fallback_with_missing_values():
+    # ค่าที่แปลงไม่ได้ (มีอักษรไทยอยู่แล้ว) → ทีละค่า; ค่าว่างต้องไม่กลายเป็นค่าของแถวอื่น
+    s = pd.Series(["\xbe\xc3", None, "ไทย", "\xbe\xc3"])
+    out = converter.convert_text_thai(s)
+    assert _same(out.tolist(), _expected(s))
+    assert out.iloc[2] == "ไทย"